@@ -0,0 +1,113 @@
+"""
+Benchmark of the edits engine against sequential `str.replace`.
+
+Builds synthetic FS Manager style pages and an edits file with many entries, then times the previous
+sequential replacement against the single scan in "exact" and "single_pass" modes. Checks that "exact" mode
+gives the same output as sequential replacement.
+
+Run from the repository root with `python benchmarks/bench_edits.py`.
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import editor  # noqa: E402
+
+PAGE_COUNT = 200
+ROWS_PER_PAGE = 400
+EDIT_COUNT = 60
+REPEATS = 3
+
+
+def replace_strings(text: str, replacements: dict[str, str]) -> str:
+    for original, replacement in replacements.items():
+        text = text.replace(original, replacement)
+    return text
+
+
+def make_edits(count: int) -> dict[str, str]:
+    edits = {
+        "Solo DANCE / ": "",
+        " / Solo DANCE": "",
+        "Time Schedule &nbsp;(pdf)": "",
+        '<link rel="shortcut icon" type="image/png" href="../favicon_clear.png">': (
+            '<link rel="shortcut icon" type="image/png" href="some-other-favicon.png">'
+        ),
+    }
+    for index in range(count - len(edits)):
+        edits[f"Club Name {index:03d}"] = f"Club {index:03d}"
+    return edits
+
+
+def make_page(random_source: random.Random, rows: int) -> str:
+    lines = [
+        "<html><head>",
+        '<link rel="shortcut icon" type="image/png" href="../favicon_clear.png">',
+        "</head><body>",
+        "<h2>Solo DANCE / Junior Women</h2><table>",
+    ]
+    for row in range(rows):
+        club = random_source.randrange(EDIT_COUNT * 2)
+        lines.append(
+            f'<tr><td class="CellLeft">{row + 1}</td><td>Skater {row}</td>'
+            f"<td>Club Name {club:03d}</td><td>{random_source.randrange(100)}.00</td></tr>"
+        )
+    lines.append("<p>Time Schedule &nbsp;(pdf)</p></table></body></html>")
+    return "\n".join(lines)
+
+
+def time_call(function, pages: list[str]) -> tuple[float, list[str]]:
+    best = float("inf")
+    outputs = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        outputs = [function(page) for page in pages]
+        best = min(best, time.perf_counter() - start)
+    return best, outputs
+
+
+def main():
+    random_source = random.Random(0)
+    edits = make_edits(EDIT_COUNT)
+    pages = [make_page(random_source, ROWS_PER_PAGE) for _ in range(PAGE_COUNT)]
+    megabytes = sum(len(page) for page in pages) / 1e6
+    print(f"{PAGE_COUNT} pages, {megabytes:.1f} MB of text, {len(edits)} edits")
+
+    exact_engine = editor.ReplacementEngine(edits, editor.ReplacementEngine.exact)
+    single_pass_engine = editor.ReplacementEngine(
+        edits, editor.ReplacementEngine.single_pass
+    )
+    print(f"Edits independent: {exact_engine.independent}")
+
+    sequential_time, expected = time_call(
+        lambda page: replace_strings(page, edits), pages
+    )
+    exact_time, exact_output = time_call(exact_engine.apply, pages)
+    single_pass_time, _ = time_call(single_pass_engine.apply, pages)
+    stream_time, stream_output = time_call(
+        lambda page: "".join(
+            exact_engine.stream(
+                (page[i : i + 65536] for i in range(0, len(page), 65536)), 65536
+            )
+        ),
+        pages,
+    )
+
+    assert exact_output == expected, "exact mode differs from sequential replacement"
+    assert stream_output == expected, "streamed exact mode differs from sequential"
+
+    for name, elapsed in [
+        ("sequential str.replace", sequential_time),
+        ("exact", exact_time),
+        ("exact, streamed", stream_time),
+        ("single_pass", single_pass_time),
+    ]:
+        print(f"{name:>24}: {elapsed * 1000:8.1f} ms ({megabytes / elapsed:6.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
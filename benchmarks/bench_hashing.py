@@ -0,0 +1,113 @@
+"""
+Benchmark of folder hashing on a synthetic site of 2,000 files.
+
+Compares the previous serial sha256 hashing in 8 KiB reads with the thread pool and reusable buffer, for each
+available hash algorithm, and a second pass served from the stat cache. The speedup of the thread pool depends
+on the number of cores.
+
+Run from the repository root with `python benchmarks/bench_hashing.py`.
+"""
+
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import editor  # noqa: E402
+
+FILE_COUNT = 2000
+PDF_EVERY = 20
+HTML_SIZES = (8_000, 120_000)
+PDF_SIZES = (200_000, 2_000_000)
+
+
+def hash_legacy(filepath: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        while chunk := f.read(8192):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def make_site(folder: str) -> int:
+    random_source = random.Random(0)
+    total_size = 0
+    for index in range(FILE_COUNT):
+        if index % PDF_EVERY == 0:
+            name = f"SEG{index:04d}JudgesDetailsperSkater.pdf"
+            size = random_source.randint(*PDF_SIZES)
+        else:
+            name = f"SEG{index:04d}.htm"
+            size = random_source.randint(*HTML_SIZES)
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(random_source.randbytes(size))
+        total_size += size
+    return total_size
+
+
+def time_call(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        total_size = make_site(folder)
+        megabytes = total_size / 1e6
+        paths = [entry.path for entry in os.scandir(folder)]
+        print(
+            f"{FILE_COUNT} files, {megabytes:.0f} MB, {editor.HASH_WORKERS} hashing threads"
+        )
+        # Warm the page cache so every run reads from memory
+        [hash_legacy(path) for path in paths]
+
+        results = [
+            (
+                "serial sha256, 8 KiB reads",
+                time_call(lambda: [hash_legacy(path) for path in paths]),
+            )
+        ]
+        for algorithm in editor.HASH_ALGORITHMS:
+            try:
+                editor.new_hash(algorithm)
+            except ValueError:
+                print(f"Skipping {algorithm}: not available")
+                continue
+            results.append(
+                (
+                    f"pooled {algorithm}",
+                    time_call(
+                        lambda: editor.create_hash_dict(folder, algorithm=algorithm)
+                    ),
+                )
+            )
+
+        stat_cache = dict()
+        for path in paths:
+            os.utime(path, ns=(0, 0))
+        editor.create_hash_dict(folder, stat_cache=stat_cache)
+        results.append(
+            (
+                "stat cache, unchanged",
+                time_call(
+                    lambda: editor.create_hash_dict(folder, stat_cache=stat_cache)
+                ),
+            )
+        )
+
+        expected = {path: hash_legacy(path) for path in paths}
+        assert editor.create_hash_dict(folder) == expected
+
+        for name, elapsed in results:
+            print(
+                f"{name:>28}: {elapsed * 1000:8.1f} ms ({megabytes / elapsed:8.1f} MB/s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark of parsing the panel schedule from index.htm.
+
+Compares the previous BeautifulSoup parser, kept here as a reference, with the lxml parser in `editor`. Both are
+first checked to give the same schedule for every page in `benchmarks/fixtures`, which the lxml parser is given
+both as text and as bytes, then timed on those pages and on a synthetic schedule of 600 segments over 10 days.
+
+Run from the repository root with `python benchmarks/bench_panel.py`.
+"""
+
+import glob
+import os
+import sys
+import time
+import warnings
+
+from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+from PySide6.QtCore import QDateTime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import editor  # noqa: E402
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SYNTHETIC_DAYS = 10
+SYNTHETIC_SEGMENTS_PER_DAY = 60
+REPEATS = 20
+
+
+def create_panel_dict_bs4(
+    index_page_html: str,
+    parser: str = "lxml",
+    tag_name: str = "table",
+    attributes: dict = {"width": "70%"},
+    target_table_index: int = 0,
+) -> dict[str, QDateTime]:
+    soup = BeautifulSoup(index_page_html, features=parser)
+    category_table = soup.find_all(tag_name, attributes)[target_table_index]
+    rows: list = category_table.find_all("tr")
+    rows.pop(0)
+
+    segments = []
+    date = None
+    for row in rows:
+        cells = row.find_all("td")
+        if "TabHeadWhite" in f"{row}" and "<th>" not in f"{row}":
+            date = cells[0].text.strip()
+        elif len(cells) > 0:
+            time = cells[1].text.strip()
+            link = cells[3].find_all("a", href=True)[0].get("href")
+            date_obj = QDateTime.fromString(f"{date} {time}", "dd.MM.yyyy h:mm:ss")
+            segments.append((date_obj, link))
+
+    seg_dict = dict()
+    for datetime_obj, filename in segments:
+        judges_filename = filename.replace(".htm", "OF.htm")
+        seg_dict[judges_filename] = datetime_obj
+
+    return seg_dict
+
+
+def make_schedule() -> str:
+    rows = [
+        '<tr class="TabHeadWhite"><th>Date</th><th>Time</th><th>Category</th><th>Segment</th>'
+        "<th>&nbsp;</th><th>&nbsp;</th></tr>"
+    ]
+    segment = 0
+    for day in range(SYNTHETIC_DAYS):
+        rows.append(
+            f'<tr class="TabHeadWhite"><td colspan="6">{day + 1:02d}.03.2026</td></tr>'
+        )
+        for index in range(SYNTHETIC_SEGMENTS_PER_DAY):
+            segment += 1
+            hour, minute = divmod(7 * 60 + index * 13, 60)
+            rows.append(
+                f'<tr class="Line{index % 2 + 1}White"><td>Category {index}</td><td>{hour}:{minute:02d}:00</td>'
+                f'<td class="CellLeft">Category {index}</td>'
+                f'<td class="CellLeft"><a href="SEG{segment:04d}.htm">Free Skating</a></td>'
+                f'<td><a href="SEG{segment:04d}SO.htm">Starting Order</a></td>'
+                f'<td><a href="SEG{segment:04d}OF.htm">Panel of Judges</a></td></tr>'
+            )
+    return (
+        '<html><body><table width="100%"><tr><td>Event</td></tr></table>'
+        f'<table width="70%">{"".join(rows)}</table></body></html>'
+    )
+
+
+def time_parser(parser, html: str) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        parser(html)
+    return (time.perf_counter() - start) / REPEATS
+
+
+def main():
+    # Fixtures with an XML declaration are parsed as HTML by both parsers, as FS Manager pages are.
+    warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+    pages = dict()
+    for filepath in sorted(glob.glob(os.path.join(FIXTURES_FOLDER, "index_*.htm"))):
+        with open(filepath, "r") as f:
+            pages[os.path.basename(filepath)] = f.read()
+    pages["synthetic (600 segments)"] = make_schedule()
+
+    for name, html in pages.items():
+        reference = create_panel_dict_bs4(html)
+        result = editor.create_panel_dict(html)
+        if result != reference:
+            raise AssertionError(f"Schedules differ for {name}")
+        if editor.create_panel_dict(html.encode("utf-8")) != reference:
+            raise AssertionError(f"Schedules differ for {name} parsed from bytes")
+        if not all(start_time.isValid() for start_time in result.values()):
+            raise AssertionError(f"Invalid start times parsed from {name}")
+
+    print(
+        f"{'Page':<28}{'Segments':>10}{'bs4 (ms)':>12}{'lxml (ms)':>12}{'Speedup':>10}"
+    )
+    for name, html in pages.items():
+        legacy_time = time_parser(create_panel_dict_bs4, html)
+        lxml_time = time_parser(editor.create_panel_dict, html)
+        print(
+            f"{name:<28}{len(editor.create_panel_dict(html)):>10}{legacy_time * 1000:>12.2f}"
+            f"{lxml_time * 1000:>12.2f}{legacy_time / lxml_time:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
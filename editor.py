@@ -1,154 +1,1055 @@
 # FSM Web Uploader - an FTP program for uploading FS Manager websites via FTP
 # Copyright (C) 2025  Robert Hayes
 
-from bs4 import BeautifulSoup
-from PySide6.QtCore import QDateTime
+from PySide6.QtCore import QDate, QDateTime, QTime
+from typing import Iterable, Iterator, NamedTuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import lxml.etree
 import os
+import mmap
+import re
 import hashlib
+import json
+import threading
+import time
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 TARGET_PDFS = ("JudgesDetailsperSkater.pdf",)
+# "copy" uploads target PDFs from copies in the website folder, "direct" from the FS Manager folder, and
+# "direct_link" also links or copies them into the website folder.
+PDF_UPLOAD_MODES = ("copy", "direct", "direct_link")
+START_TIME_PATTERN = re.compile(r"(\d{2})\.(\d{2})\.(\d{4}) (\d{1,2}):(\d{2}):(\d{2})")
+EDITABLE_TEXT_EXTENSIONS = ("htm", "html", "txt")
+SAVE_FORMAT_VERSION = 2
+# Files modified this recently may change again within the timestamp resolution of the filesystem without
+# their stat changing, so their checksums are not cached.
+STAT_RACE_MARGIN_NS = 2_000_000_000
+HASH_ALGORITHMS = ("sha256", "blake2b", "xxh3_128")
+HASH_BUFFER_SIZE = 1024 * 1024
+MMAP_THRESHOLD_BYTES = 16 * 1024 * 1024
+# hashlib releases the GIL while hashing, so files are hashed on a pool of threads.
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+HASH_BUFFERS = threading.local()
 
 
-def hash_sha256(filepath: str):
+def stream_replace(
+    chunks: Iterable[str], original: str, replacement: str
+) -> Iterator[str]:
     """
-    Return the sha256 checksum of a given binary.
+    Apply `str.replace` to a stream of text chunks.
+
+    The last `len(original) - 1` characters of each chunk are held back until the next one arrives, so matches
+    spanning a chunk boundary are found and the output is identical to replacing in the joined text.
+    """
+    if original == "":
+        for chunk in chunks:
+            if chunk:
+                yield replacement + replacement.join(chunk)
+        yield replacement
+        return
+
+    held_back = len(original) - 1
+    carry = ""
+    for chunk in chunks:
+        buffer = carry + chunk
+        safe_length = len(buffer) - held_back
+        output = []
+        position = 0
+        while (match := buffer.find(original, position)) != -1:
+            if match >= safe_length:
+                break
+            output.append(buffer[position:match])
+            output.append(replacement)
+            position = match + len(original)
+        cut = max(position, safe_length)
+        output.append(buffer[position:cut])
+        carry = buffer[cut:]
+        yield "".join(output)
+    yield carry.replace(original, replacement)
+
+
+def merged_overlaps(first: str, second: str) -> list[str]:
+    """
+    List the strings made by an occurrence of the first string overlapping the start of an occurrence of the
+    second, such as "abcd" for "abc" and "bcd".
+    """
+    return [
+        first + second[length:]
+        for length in range(1, min(len(first), len(second)))
+        if first.endswith(second[:length])
+    ]
+
+
+def compile_literal_pattern(strings: Iterable[str]) -> re.Pattern | None:
+    """
+    Compile a regular expression matching any of the given strings, preferring the longest at each position.
+
+    The strings are arranged in a trie so the expression checks shared prefixes once, which is much faster than
+    an alternation of every string when there are many of them.
+    """
+    trie = {}
+    for string in strings:
+        node = trie
+        for character in string:
+            node = node.setdefault(character, {})
+        node[""] = {}
+    if len(trie) == 0:
+        return None
+
+    def build(node: dict) -> str:
+        branches = [
+            re.escape(character) + build(child)
+            for character, child in sorted(node.items())
+            if character != ""
+        ]
+        if len(branches) == 0:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        expression = "(?:" + "|".join(branches) + ")"
+        return expression + "?" if "" in node else expression
+
+    return re.compile(build(trie))
+
+
+class ReplacementEngine:
+    """
+    Applies the replacements of an edits file to text, compiled once for every file uploaded.
+
+    All keys are compiled into one regular expression, so text is edited in a single left-to-right scan that
+    replaces the longest key starting at each position.
+
+    In "exact" mode the output is always the same as applying each edit in turn with `str.replace`, in the order
+    of the edits file. Edit sets where one edit can produce the key of a later one are always applied in
+    sequence. Otherwise the single scan is used, unless the text contains overlapping occurrences of keys, or a
+    deletion would join the text either side of it into a key. Either case falls back to editing the file in
+    sequence.
+
+    In "single_pass" mode the scan is always used. Text produced by an edit, or brought together by a deletion, is
+    never edited again, and where occurrences of two keys overlap the leftmost (then the longest) is replaced,
+    whatever their order in the edits file. Empty keys are ignored.
+    """
+
+    exact = "exact"
+    single_pass = "single_pass"
+    modes = (exact, single_pass)
+
+    def __init__(self, replacements: dict[str, str], mode: str = exact):
+        if mode not in self.modes:
+            raise ValueError(
+                f"Unknown edits mode {mode!r}, expected one of {self.modes}"
+            )
+        self.replacements = dict(replacements)
+        self.mode = mode
+        self.digest = hashlib.sha256(
+            json.dumps([mode, list(self.replacements.items())]).encode("utf-8")
+        ).hexdigest()
+
+        keys = [key for key in self.replacements if key != ""]
+        self.pattern = compile_literal_pattern(keys)
+        self.longest_key = max((len(key) for key in keys), default=0)
+
+        self.independent = self.check_independent()
+        self.conflicts = set(self.find_conflicts())
+        self.deleted_keys = {key for key in keys[:-1] if self.replacements[key] == ""}
+        self.hazard_pattern = None
+        if self.mode == self.exact and self.independent:
+            self.hazard_pattern = compile_literal_pattern(
+                self.conflicts | self.deleted_keys
+            )
+        if len(self.deleted_keys) > 0:
+            check_strings = keys + list(self.conflicts)
+            self.seam_reach = max(len(string) for string in check_strings) - 1
+            self.seam_pairs = {
+                string[position : position + 2]
+                for string in check_strings
+                for position in range(len(string) - 1)
+            }
+            self.seam_pattern = re.compile(
+                f"(?=({compile_literal_pattern(check_strings).pattern}))"
+            )
+
+    def check_independent(self) -> bool:
+        """
+        Check that no edit can produce the key of a later edit, so the edits can be applied in a single scan.
+        """
+        edits = list(self.replacements.items())
+        keys = [original for original, _ in edits]
+        if "" in keys:
+            return False
+        for position, (_, replacement) in enumerate(edits):
+            if replacement == "":
+                continue
+            for later_key in keys[position + 1 :]:
+                if later_key in replacement or replacement in later_key:
+                    return False
+                if merged_overlaps(later_key, replacement) or merged_overlaps(
+                    replacement, later_key
+                ):
+                    return False
+        return True
+
+    def find_conflicts(self) -> list[str]:
+        """
+        List the text whose presence means occurrences of keys overlap, where the single scan may replace a
+        different key than applying the edits in sequence would.
+        """
+        keys = [key for key in self.replacements if key != ""]
+        conflicts = []
+        for position, first in enumerate(keys):
+            for second in keys:
+                conflicts.extend(merged_overlaps(first, second))
+            for later_key in keys[position + 1 :]:
+                if first in later_key:
+                    conflicts.append(later_key)
+        return conflicts
+
+    def finds_hazard(self, text: str) -> bool:
+        """
+        Check whether the single scan could edit the text differently to applying the edits in sequence.
+
+        That is the case if occurrences of keys overlap, or if deleting text could join the text either side of it
+        into a key, or into overlapping keys. Deletions close enough together to interact are assumed to do so. A
+        key can only span the join if it contains the pair of characters either side of it, which rules out most
+        deletions without searching.
+        """
+        last_deletion_end = None
+        for match in self.hazard_pattern.finditer(text):
+            if match.group(0) in self.conflicts:
+                return True
+            start, end = match.span()
+            window_start = max(0, start - self.seam_reach)
+            window_end = end + self.seam_reach
+            if last_deletion_end is not None and last_deletion_end > window_start:
+                return True
+            last_deletion_end = end
+            if text[start - 1 : start] + text[end : end + 1] not in self.seam_pairs:
+                continue
+            joined_text = text[window_start:start] + text[end:window_end]
+            seam = start - window_start
+            for seam_match in self.seam_pattern.finditer(joined_text):
+                if seam_match.start() >= seam:
+                    break
+                if seam_match.end(1) > seam:
+                    return True
+        return False
+
+    def replace_match(self, match: re.Match) -> str:
+        return self.replacements[match.group(0)]
+
+    def apply_sequential(self, text: str) -> str:
+        for original, replacement in self.replacements.items():
+            text = text.replace(original, replacement)
+        return text
+
+    def apply_single_pass(self, text: str) -> str:
+        if self.pattern is None:
+            return text
+        return self.pattern.sub(self.replace_match, text)
+
+    def apply(self, text: str) -> str:
+        """
+        Apply the edits to a whole text.
+        """
+        if self.mode == self.single_pass:
+            return self.apply_single_pass(text)
+        if not self.independent:
+            return self.apply_sequential(text)
+        if self.hazard_pattern is not None and self.finds_hazard(text):
+            return self.apply_sequential(text)
+        return self.apply_single_pass(text)
+
+    def stream(self, chunks: Iterable[str], block_size: int) -> Iterator[str]:
+        """
+        Apply the edits to a stream of text chunks.
+
+        Only holds a chunk of text at a time, except in exact mode where the text must be checked before or after
+        the single scan: those files are edited whole with `apply`.
+        """
+        if self.mode == self.exact and not self.independent:
+            for original, replacement in self.replacements.items():
+                chunks = stream_replace(chunks, original, replacement)
+            yield from chunks
+        elif self.hazard_pattern is not None:
+            edited_text = self.apply("".join(chunks))
+            for position in range(0, len(edited_text), block_size):
+                yield edited_text[position : position + block_size]
+        elif self.pattern is None:
+            yield from chunks
+        else:
+            yield from self.stream_single_pass(chunks)
+
+    def stream_single_pass(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Scan a stream of text chunks once, holding back enough of each chunk to find keys spanning a boundary.
+        """
+        held_back = self.longest_key - 1
+        carry = ""
+        for chunk in chunks:
+            buffer = carry + chunk
+            safe_length = len(buffer) - held_back
+            output = []
+            position = 0
+            for match in self.pattern.finditer(buffer):
+                if match.start() >= safe_length:
+                    break
+                output.append(buffer[position : match.start()])
+                output.append(self.replace_match(match))
+                position = match.end()
+            cut = max(position, safe_length)
+            output.append(buffer[position:cut])
+            carry = buffer[cut:]
+            yield "".join(output)
+        yield self.pattern.sub(self.replace_match, carry)
+
+
+class EditCache:
+    """
+    Bounded cache of edited file contents, keyed by the sha256 checksum of the source file and the digest of the
+    edits applied to it, so a file uploaded again without changes is not edited again.
+
+    Entries are held in memory up to `max_bytes`, evicting the least recently used ("lru") or the oldest ("fifo")
+    entry first. If a folder is given, entries are also written to it, up to `disk_max_bytes` under the same
+    policy, so they survive a restart. A single entry may take at most an eighth of either limit. Shared by
+    every upload session, so access is locked.
+    """
+
+    policies = ("lru", "fifo")
+
+    def __init__(
+        self,
+        max_bytes: int,
+        policy: str = "lru",
+        folder: str | None = None,
+        disk_max_bytes: int = 0,
+    ):
+        if policy not in self.policies:
+            raise ValueError(
+                f"Unknown edit cache policy {policy!r}, expected one of {self.policies}"
+            )
+        self.max_bytes = max(0, max_bytes)
+        self.policy = policy
+        self.folder = folder
+        self.disk_max_bytes = max(0, disk_max_bytes) if folder is not None else 0
+        self.max_entry_bytes = max(self.max_bytes, self.disk_max_bytes) // 8
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, bytes] = OrderedDict()
+        self.size = 0
+        self.disk_entries: OrderedDict[str, int] = OrderedDict()
+        self.disk_size = 0
+        if self.disk_max_bytes > 0:
+            self.load_disk_entries()
+
+    def load_disk_entries(self):
+        os.makedirs(self.folder, exist_ok=True)
+        entries = []
+        with os.scandir(self.folder) as directory:
+            for entry in directory:
+                if entry.is_file() and entry.name.endswith(".cache"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self.disk_entries[name] = size
+            self.disk_size += size
+
+    @staticmethod
+    def make_key(source_hash: str, edits_digest: str) -> str:
+        return f"{source_hash}-{edits_digest[:16]}.cache"
+
+    def get(self, source_hash: str, edits_digest: str) -> bytes | None:
+        """
+        Return the cached edited contents, or `None` if they are not cached.
+        """
+        key = self.make_key(source_hash, edits_digest)
+        with self.lock:
+            if key in self.entries:
+                if self.policy == "lru":
+                    self.entries.move_to_end(key)
+                return self.entries[key]
+            if key not in self.disk_entries:
+                return None
+            if self.policy == "lru":
+                self.disk_entries.move_to_end(key)
+        try:
+            with open(os.path.join(self.folder, key), "rb") as f:
+                content = f.read()
+            if self.policy == "lru":
+                os.utime(os.path.join(self.folder, key))
+        except OSError:
+            with self.lock:
+                self.disk_size -= self.disk_entries.pop(key, 0)
+            return None
+        with self.lock:
+            self.add_to_memory(key, content)
+        return content
+
+    def put(self, source_hash: str, edits_digest: str, content: bytes):
+        """
+        Cache the edited contents of a file, unless they are too large to cache.
+        """
+        if len(content) > self.max_entry_bytes:
+            return
+        key = self.make_key(source_hash, edits_digest)
+        with self.lock:
+            self.add_to_memory(key, content)
+            write_to_disk = (
+                len(content) <= self.disk_max_bytes // 8
+                and key not in self.disk_entries
+            )
+            if write_to_disk:
+                self.disk_entries[key] = len(content)
+                self.disk_size += len(content)
+                evicted = self.evict_from_disk()
+        if not write_to_disk:
+            return
+        try:
+            temporary_path = os.path.join(self.folder, f"{key}.tmp")
+            with open(temporary_path, "wb") as f:
+                f.write(content)
+            os.replace(temporary_path, os.path.join(self.folder, key))
+        except OSError:
+            with self.lock:
+                self.disk_size -= self.disk_entries.pop(key, 0)
+        for name in evicted:
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                pass
+
+    def add_to_memory(self, key: str, content: bytes):
+        if key in self.entries or len(content) > self.max_bytes // 8:
+            return
+        self.entries[key] = content
+        self.size += len(content)
+        while self.size > self.max_bytes:
+            _, evicted_content = self.entries.popitem(last=False)
+            self.size -= len(evicted_content)
+
+    def evict_from_disk(self) -> list[str]:
+        evicted = []
+        while self.disk_size > self.disk_max_bytes:
+            name, size = self.disk_entries.popitem(last=False)
+            self.disk_size -= size
+            evicted.append(name)
+        return evicted
+
+
+def compile_normalisation_rules(rules: list[str]) -> list[re.Pattern]:
+    """
+    Compile regular expressions matching volatile content, such as generation timestamps, in text files.
+
+    Rules are compiled to match raw bytes so files can be normalised without decoding them.
+    """
+    compiled_rules = []
+    for rule in rules:
+        try:
+            compiled_rules.append(re.compile(rule.encode("utf-8")))
+        except re.error as e:
+            raise ValueError(f"Invalid normalisation rule {rule!r}: {e}")
+    return compiled_rules
+
+
+def normalise_bytes(data: bytes, normalisation_rules: list[re.Pattern]) -> bytes:
+    """
+    Strip the regions matched by the normalisation rules, leaving only the content that matters for change
+    detection.
+    """
+    for rule in normalisation_rules:
+        data = rule.sub(b"", data)
+    return data
+
+
+def new_hash(algorithm: str = "sha256"):
+    """
+    Create a running hash for one of `HASH_ALGORITHMS`. xxh3_128 needs the optional xxhash package.
+    """
+    if algorithm == "sha256":
+        return hashlib.sha256()
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=32)
+    if algorithm == "xxh3_128":
+        if xxhash is None:
+            raise ValueError("The xxh3_128 hash algorithm needs the xxhash package")
+        return xxhash.xxh3_128()
+    raise ValueError(
+        f"Unknown hash algorithm {algorithm!r}, expected one of {HASH_ALGORITHMS}"
+    )
+
+
+class ContentDigest:
+    """
+    Running checksum of a file's content, normalised first if rules are given.
+
+    Normalisation needs the whole file, so chunks are gathered when there are rules. Rules only ever apply to
+    text files, which are small.
+    """
+
+    def __init__(
+        self,
+        normalisation_rules: list[re.Pattern] | None = None,
+        algorithm: str = "sha256",
+    ):
+        self.normalisation_rules = normalisation_rules
+        self.algorithm = algorithm
+        self.file_hash = new_hash(algorithm)
+        self.chunks = []
+
+    def update(self, chunk: bytes):
+        if self.normalisation_rules:
+            self.chunks.append(bytes(chunk))
+        else:
+            self.file_hash.update(chunk)
+
+    def hexdigest(self) -> str:
+        if self.normalisation_rules:
+            normalised_content = normalise_bytes(
+                b"".join(self.chunks), self.normalisation_rules
+            )
+            file_hash = new_hash(self.algorithm)
+            file_hash.update(normalised_content)
+            return file_hash.hexdigest()
+        return self.file_hash.hexdigest()
+
+
+def get_normalisation_rules(
+    filepath: str, normalisation_rules: list[re.Pattern] | None
+) -> list[re.Pattern] | None:
+    """
+    Return the rules that apply to a file: normalisation only applies to text files.
+    """
+    if filepath.endswith(EDITABLE_TEXT_EXTENSIONS):
+        return normalisation_rules
+    return None
+
+
+def get_hash_buffer() -> bytearray:
+    """
+    Return the read buffer of the calling thread, so hashing many files does not allocate a buffer for each.
+    """
+    buffer = getattr(HASH_BUFFERS, "buffer", None)
+    if buffer is None:
+        buffer = HASH_BUFFERS.buffer = bytearray(HASH_BUFFER_SIZE)
+    return buffer
+
+
+def hash_file(
+    filepath: str,
+    normalisation_rules: list[re.Pattern] | None = None,
+    algorithm: str = "sha256",
+):
+    """
+    Return the checksum of a given binary, normalising text files if rules are given.
+
+    Large files are hashed through a memory map and others are read into a reusable buffer.
     """
     try:
         with open(filepath, "rb") as f:
-            file_hash = hashlib.sha256()
-            while chunk := f.read(8192):
-                file_hash.update(chunk)
+            rules = get_normalisation_rules(filepath, normalisation_rules)
+            file_hash = ContentDigest(rules, algorithm)
+            if not rules and os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD_BYTES:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                    file_hash.update(mapped_file)
+            else:
+                buffer = get_hash_buffer()
+                view = memoryview(buffer)
+                while n_bytes := f.readinto(buffer):
+                    file_hash.update(view[:n_bytes])
         return file_hash.hexdigest()
     except FileNotFoundError:
         return None
 
 
-def list_pdfs_to_copy(
-    pdf_root_dir: str, local_website_dir: str, target_pdfs: list[str]
-) -> list[str]:
+def hash_sha256(filepath: str, normalisation_rules: list[re.Pattern] | None = None):
     """
-    Scans the FS Manager directory for PDFs of the target type, comparing them against PDFs already in the
-    local website directory, listing only missing or updated PDFs.
+    Return the sha256 checksum of a given binary, normalising text files if rules are given.
     """
-    file_paths = []
-    for root, _, files in os.walk(pdf_root_dir):
-        for file in files:
-            abs_path = os.path.abspath(os.path.join(root, file))
-            file_paths.append(abs_path)
+    return hash_file(filepath, normalisation_rules, "sha256")
 
-    fsm_pdf_dict = dict()
-    pdfs_in_fsm_dir = [
-        pdf
-        for pdf in file_paths
-        if any(target_file in pdf for target_file in target_pdfs)
-    ]
-    for pdf in pdfs_in_fsm_dir:
-        fsm_pdf_dict[os.path.basename(pdf)] = pdf
-
-    web_pdf_dict = dict()
-    pdfs_in_web_dir = [
-        pdf
-        for pdf in os.listdir(local_website_dir)
-        if any(target_file in pdf for target_file in target_pdfs)
+
+def hash_files(
+    filepaths: list[str],
+    normalisation_rules: list[re.Pattern] | None = None,
+    algorithm: str = "sha256",
+) -> list[str | None]:
+    """
+    Hash several files on a pool of threads, returning their checksums in order.
+    """
+    if len(filepaths) < 2 or HASH_WORKERS == 1:
+        return [hash_file(path, normalisation_rules, algorithm) for path in filepaths]
+    with ThreadPoolExecutor(HASH_WORKERS) as pool:
+        return list(
+            pool.map(
+                lambda path: hash_file(path, normalisation_rules, algorithm),
+                filepaths,
+            )
+        )
+
+
+class PdfEntry(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+
+
+class PdfIndex:
+    """
+    Index of the target PDFs under the FS Manager PDF folder, by basename.
+
+    Built with a single walk using `os.scandir`, which only stats files whose names match a target and never
+    follows links, then kept up to date from the events of the PDF watcher. Where two files share a name, the
+    most recently modified is indexed.
+    """
+
+    def __init__(self, root_folder: str, target_pdfs: tuple[str, ...] = TARGET_PDFS):
+        self.root_folder = os.path.abspath(root_folder)
+        self.target_pdfs = tuple(target_pdfs)
+        self.entries: dict[str, PdfEntry] = dict()
+
+    def scan(self):
+        self.entries = dict()
+        folders = [self.root_folder]
+        while len(folders) > 0:
+            try:
+                with os.scandir(folders.pop()) as folder:
+                    for entry in folder:
+                        if entry.is_dir(follow_symlinks=False):
+                            folders.append(entry.path)
+                        elif entry.name.endswith(self.target_pdfs):
+                            self.add_entry(entry.path, entry.stat())
+            except OSError:
+                continue
+
+    def add_entry(self, filepath: str, stat_result: os.stat_result):
+        new_entry = PdfEntry(
+            os.path.abspath(filepath), stat_result.st_size, stat_result.st_mtime_ns
+        )
+        basename = os.path.basename(filepath)
+        current_entry = self.entries.get(basename)
+        if (
+            current_entry is None
+            or current_entry.path == new_entry.path
+            or current_entry.mtime_ns <= new_entry.mtime_ns
+        ):
+            self.entries[basename] = new_entry
+
+    def update(self, filepath: str):
+        """
+        Record the current state of a file reported by the watcher, removing it if it no longer exists.
+        """
+        filepath = os.path.abspath(filepath)
+        if not filepath.startswith(self.root_folder + os.sep):
+            return
+        if not filepath.endswith(self.target_pdfs):
+            return
+        try:
+            self.add_entry(filepath, os.stat(filepath))
+        except FileNotFoundError:
+            basename = os.path.basename(filepath)
+            current_entry = self.entries.get(basename)
+            if current_entry is not None and current_entry.path == filepath:
+                del self.entries[basename]
+
+
+def pdf_needs_copy(source: PdfEntry, destination_path: str) -> bool:
+    """
+    Check whether the website folder copy of a PDF differs from its source.
+
+    Copies are compared on their stats first. A copy of the same size made after the source was last modified
+    is current, and only otherwise are both files hashed.
+    """
+    try:
+        destination_stat = os.stat(destination_path)
+    except FileNotFoundError:
+        return True
+    if destination_stat.st_size != source.size:
+        return True
+    if destination_stat.st_mtime_ns >= source.mtime_ns:
+        return False
+    source_hash, destination_hash = hash_files([source.path, destination_path])
+    return source_hash != destination_hash
+
+
+def list_pdfs_to_copy(pdf_index: PdfIndex, local_website_dir: str) -> list[str]:
+    """
+    Lists the indexed PDFs that are missing from the local website directory, or differ from the copy there.
+    """
+    return [
+        entry.path
+        for basename, entry in pdf_index.entries.items()
+        if pdf_needs_copy(entry, os.path.join(local_website_dir, basename))
     ]
-    for pdf in pdfs_in_web_dir:
-        web_pdf_dict[pdf] = os.path.join(local_website_dir, pdf)
 
-    pdfs_to_copy = []
 
-    for basename, full_path in fsm_pdf_dict.items():
-        if web_pdf_dict.get(basename) is None:
-            pdfs_to_copy.append(full_path)
-        else:
-            web_dir_pdf_hash = hash_sha256(web_pdf_dict[basename])
-            fsm_dir_pdf_hash = hash_sha256(full_path)
-            if web_dir_pdf_hash != fsm_dir_pdf_hash:
-                pdfs_to_copy.append(full_path)
+def get_stat_key(stat_result: os.stat_result) -> tuple[int, int, int]:
+    return (stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino)
 
-    return pdfs_to_copy
 
+def is_website_copy_of_pdf(
+    filepath: str, local_website_folder: str, target_pdfs: tuple = TARGET_PDFS
+) -> bool:
+    """
+    Check whether a file is a target PDF in the root of the website folder, where PDFs from FS Manager are copied.
 
-def create_hash_dict(folder_path: str) -> dict[str, str]:
+    Target PDFs in subfolders of the website folder are not copies, so are uploaded like any other file.
     """
-    Documents the state of the folder, creating a dictionary of filepaths and sha256 checksums.
+    return (
+        filepath.endswith(target_pdfs)
+        and os.path.dirname(os.path.abspath(filepath)) == local_website_folder
+    )
+
+
+def is_file_locked(filepath: str) -> bool:
+    """
+    Check whether another process has a file open for writing, which only Windows reports.
+
+    Files that could not be opened for writing anyway, such as read-only files, are never reported as locked.
+    """
+    if os.name != "nt" or not os.access(filepath, os.W_OK):
+        return False
+    try:
+        with open(filepath, "r+b"):
+            pass
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def get_rules_digest(normalisation_rules: list[re.Pattern] | None) -> str:
+    """
+    Return a checksum identifying a set of normalisation rules, as checksums made with other rules differ.
+    """
+    patterns = [rule.pattern.decode("utf-8") for rule in normalisation_rules or []]
+    return hashlib.sha256(json.dumps(patterns).encode("utf-8")).hexdigest()
+
+
+def hash_paths(
+    filepaths: Iterable[str],
+    normalisation_rules: list[re.Pattern] | None = None,
+    stat_cache: dict[str, tuple[tuple[int, int, int], str]] | None = None,
+    algorithm: str = "sha256",
+) -> dict[str, str]:
+    """
+    Create a dictionary of filepaths and checksums for the given files.
+
+    If a stat cache is given, files whose size, modification time and inode match their entry reuse its
+    checksum instead of being read, and entries are updated for every file hashed.
     """
     hash_dict = dict()
-    for path in os.listdir(folder_path):
-        abs_path = os.path.join(folder_path, path)
-        hash_dict[abs_path] = hash_sha256(abs_path)
+    time_now = time.time_ns()
+    stat_keys = dict()
+    for abs_path in filepaths:
+        hash_dict[abs_path] = None
+        if stat_cache is None:
+            continue
+        try:
+            stat_key = get_stat_key(os.stat(abs_path))
+        except FileNotFoundError:
+            continue
+        cached_entry = stat_cache.get(abs_path)
+        if cached_entry is not None and cached_entry[0] == stat_key:
+            hash_dict[abs_path] = cached_entry[1]
+        else:
+            stat_keys[abs_path] = stat_key
+
+    if stat_cache is None:
+        paths_to_hash = list(hash_dict)
+    else:
+        paths_to_hash = list(stat_keys)
+    file_hashes = hash_files(paths_to_hash, normalisation_rules, algorithm)
+    for abs_path, file_hash in zip(paths_to_hash, file_hashes):
+        hash_dict[abs_path] = file_hash
+        if stat_cache is None:
+            continue
+        stat_key = stat_keys[abs_path]
+        if file_hash is not None and time_now - stat_key[1] > STAT_RACE_MARGIN_NS:
+            stat_cache[abs_path] = (stat_key, file_hash)
+        else:
+            stat_cache.pop(abs_path, None)
 
     return hash_dict
 
 
+def create_hash_dict(
+    folder_path: str,
+    normalisation_rules: list[re.Pattern] | None = None,
+    stat_cache: dict[str, tuple[tuple[int, int, int], str]] | None = None,
+    algorithm: str = "sha256",
+) -> dict[str, str]:
+    """
+    Documents the state of the folder and its subfolders, creating a dictionary of filepaths and checksums.
+    """
+    return hash_paths(
+        list_folder_files(folder_path), normalisation_rules, stat_cache, algorithm
+    )
+
+
+def list_folder_files(folder_path: str) -> list[str]:
+    """
+    Lists the files in a folder and its subfolders, without following links to folders.
+    """
+    filepaths = []
+    folders = [folder_path]
+    while len(folders) > 0:
+        with os.scandir(folders.pop()) as folder:
+            for entry in folder:
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                else:
+                    filepaths.append(entry.path)
+    return filepaths
+
+
+def get_remote_name(filepath: str, local_root: str) -> str:
+    """
+    Gives the name a file is uploaded under, relative to the remote directory and separated by forward slashes.
+
+    Files in the website folder keep their path within it. Files elsewhere, such as PDFs uploaded straight from
+    the FS Manager folder, are uploaded under their filename alone.
+    """
+    try:
+        relative_path = os.path.relpath(filepath, local_root)
+    except ValueError:
+        return os.path.basename(filepath)
+    if relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep):
+        return os.path.basename(filepath)
+    return relative_path.replace(os.sep, "/")
+
+
+def read_save_state(
+    save_state: dict, normalisation_rules: list[re.Pattern] | None = None
+) -> tuple[dict[str, str], dict[str, tuple[tuple[int, int, int], str]], str]:
+    """
+    Split a loaded save file into its checksums, stat cache and the hash algorithm of the checksums.
+
+    Save files from before the stat cache held sha256 checksums alone, and stats recorded under different
+    normalisation rules are discarded, so those files are hashed again.
+    """
+    if save_state.get("version") != SAVE_FORMAT_VERSION:
+        return dict(save_state), dict(), "sha256"
+    hash_dict = save_state["hashes"]
+    stat_cache = dict()
+    if save_state.get("rules") == get_rules_digest(normalisation_rules):
+        for path, stat_key in save_state["stats"].items():
+            if path in hash_dict:
+                stat_cache[path] = (tuple(stat_key), hash_dict[path])
+    return hash_dict, stat_cache, save_state.get("algorithm", "sha256")
+
+
+def write_save_state(
+    hash_dict: dict[str, str],
+    stat_cache: dict[str, tuple[tuple[int, int, int], str]],
+    normalisation_rules: list[re.Pattern] | None = None,
+    algorithm: str = "sha256",
+) -> dict:
+    """
+    Combine folder checksums with the stats they were computed for, ready to be written to the save file.
+    """
+    return {
+        "version": SAVE_FORMAT_VERSION,
+        "algorithm": algorithm,
+        "rules": get_rules_digest(normalisation_rules),
+        "hashes": hash_dict,
+        "stats": {
+            path: list(stat_cache[path][0])
+            for path, file_hash in hash_dict.items()
+            if path in stat_cache and stat_cache[path][1] == file_hash
+        },
+    }
+
+
+def write_json_atomically(filepath: str, data):
+    """
+    Write a JSON file through a temporary file, so a crash mid-write never leaves it truncated.
+    """
+    temporary_filepath = f"{filepath}.tmp"
+    with open(temporary_filepath, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_filepath, filepath)
+
+
+class SaveJournal:
+    """
+    Append-only journal of JSON records, one per line, such as the files uploaded and deleted since the save file
+    was last written, or the changes to the upload queue.
+
+    Records are flushed as they are written, so after a crash or emergency stop the next run knows which files
+    were already uploaded and which were still queued. A torn final line from a crash mid-write is ignored. The
+    file is kept open between records until the journal is closed or cleared.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.records = 0
+        self.file = None
+
+    def read(self) -> list[dict]:
+        records = []
+        try:
+            with open(self.filepath, "r") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        except FileNotFoundError:
+            pass
+        self.records = len(records)
+        return records
+
+    def append(self, record: dict):
+        if self.file is None:
+            self.file = open(self.filepath, "a")
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.records += 1
+
+    def rewrite(self, records: list[dict]):
+        """
+        Replace the journal with the given records, atomically.
+        """
+        self.close()
+        temp_filepath = f"{self.filepath}.tmp"
+        with open(temp_filepath, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filepath, self.filepath)
+        self.records = len(records)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def clear(self):
+        self.close()
+        try:
+            os.remove(self.filepath)
+        except FileNotFoundError:
+            pass
+        self.records = 0
+
+
 def trim_hash_dict(
     hash_dict: dict[str, str],
     segment_table: dict[str, QDateTime],
     check_time: QDateTime,
+    folder_path: str,
 ):
     """
     Takes a current folder snapshot and removes judges segments that have not yet been uploaded.
     """
     segments_in_the_future = []
-    dirname = os.path.dirname(list(hash_dict.keys())[0])
 
     for panel, start_time in segment_table.items():
         if check_time.toSecsSinceEpoch() < start_time.toSecsSinceEpoch():
             segments_in_the_future.append(panel)
 
     for panel in segments_in_the_future:
-        hash_dict.pop(os.path.join(dirname, panel), None)
+        hash_dict.pop(os.path.join(folder_path, panel), None)
 
     return hash_dict
 
 
-def list_files_to_upload(folder: str, last_folder_state: dict[str, str]) -> list[str]:
+def list_files_to_upload(
+    folder: str,
+    last_folder_state: dict[str, str],
+    normalisation_rules: list[re.Pattern] | None = None,
+    stat_cache: dict[str, tuple[tuple[int, int, int], str]] | None = None,
+    algorithm: str = "sha256",
+) -> list[str]:
     """
     Lists the files to be uploaded in a given folder, based on the previous state of the folder.
     """
-    current_folder_state = create_hash_dict(folder)
+    current_folder_state = create_hash_dict(
+        folder, normalisation_rules, stat_cache, algorithm
+    )
+    return list_changed_files(current_folder_state, last_folder_state)
+
 
+def list_changed_files(
+    current_state: dict[str, str], last_state: dict[str, str]
+) -> list[str]:
+    """
+    Lists the files whose checksums differ from, or are missing in, a previous state.
+    """
     files_to_upload = []
-    for path, hash in current_folder_state.items():
-        if last_folder_state.get(path) is None:
+    for path, hash in current_state.items():
+        if last_state.get(path) is None:
             files_to_upload.append(path)
         else:
-            if last_folder_state.get(path) != hash:
+            if last_state.get(path) != hash:
                 files_to_upload.append(path)
 
     return files_to_upload
 
 
+def parse_start_time(date: str, time: str) -> QDateTime:
+    """
+    Read a start time from the schedule as `QDateTime.fromString` would with the "dd.MM.yyyy h:mm:ss" format.
+
+    Dates and times in the usual form are read with a regular expression, which is much faster than
+    `QDateTime.fromString`. Anything else is left to `QDateTime.fromString`.
+    """
+    match = START_TIME_PATTERN.fullmatch(f"{date} {time}")
+    if match is not None:
+        day, month, year, hour, minute, second = map(int, match.groups())
+        start_date = QDate(year, month, day)
+        start_time = QTime(hour, minute, second)
+        if start_date.isValid() and start_time.isValid():
+            return QDateTime(start_date, start_time)
+    return QDateTime.fromString(f"{date} {time}", "dd.MM.yyyy h:mm:ss")
+
+
 def create_panel_dict(
-    index_page_html: str,
-    parser: str = "lxml",
+    index_page_html: str | bytes,
     tag_name: str = "table",
     attributes: dict = {"width": "70%"},
     target_table_index: int = 0,
 ) -> dict[str, QDateTime]:
     """
     Constructs a dictionary of panel pages (those ending OF.htm) and the corresponding start times of their segments.
+
+    The page is parsed with lxml and the schedule table found with XPath. Rows without header cells containing
+    an element of the `TabHeadWhite` class, the row itself or one of its cells, give the date of the rows below
+    them, which give a start time in their second cell and a link to the segment page in their fourth. Pages
+    given as bytes are decoded as they declare, and text is parsed as UTF-8 regardless of any declaration.
     """
-    soup = BeautifulSoup(index_page_html, features=parser)
-    category_table = soup.find_all(tag_name, attributes)[target_table_index]
-    rows: list = category_table.find_all("tr")
+    if isinstance(index_page_html, str):
+        parser = lxml.etree.HTMLParser(encoding="utf-8")
+        index_page_html = index_page_html.encode("utf-8")
+    else:
+        parser = lxml.etree.HTMLParser()
+    document = lxml.etree.fromstring(index_page_html, parser)
+    table_filter = "".join(f'[@{key}="{value}"]' for key, value in attributes.items())
+    category_table = document.xpath(f"//{tag_name}{table_filter}")[target_table_index]
+    rows = list(category_table.iter("tr"))
     rows.pop(0)
 
-    segments = []
+    seg_dict = dict()
     date = None
     for row in rows:
-        cells = row.find_all("td")
-        if "TabHeadWhite" in f"{row}" and "<th>" not in f"{row}":
-            date = cells[0].text.strip()
+        cells = list(row.iter("td"))
+        if (
+            len(row.xpath("descendant-or-self::*[contains(@class, 'TabHeadWhite')]"))
+            > 0
+            and row.find(".//th") is None
+        ):
+            date = "".join(cells[0].itertext()).strip()
         elif len(cells) > 0:
-            time = cells[1].text.strip()
-            link = cells[3].find_all("a", href=True)[0].get("href")
-            date_obj = QDateTime.fromString(f"{date} {time}", "dd.MM.yyyy h:mm:ss")
-            segments.append((date_obj, link))
-
-    seg_dict = dict()
-    for datetime_obj, filename in segments:
-        judges_filename = filename.replace(".htm", "OF.htm")
-        seg_dict[judges_filename] = datetime_obj
+            time = "".join(cells[1].itertext()).strip()
+            link = cells[3].xpath(".//a[@href]")[0].get("href")
+            judges_filename = link.replace(".htm", "OF.htm")
+            seg_dict[judges_filename] = parse_start_time(date, time)
 
     return seg_dict
@@ -5,8 +5,92 @@ import ftplib
 import socket
 import logging
 import io
+import re
+import time
+import calendar
+from typing import BinaryIO, Iterable, NamedTuple
 
 LOGGER = logging.getLogger(__name__)
+UPLOAD_BLOCK_SIZE = 64 * 1024
+KEEPALIVE_FILENAME = ".keep"
+SHA256_PATTERN = re.compile(r"\b[0-9a-fA-F]{64}\b")
+
+
+class RemoteFile(NamedTuple):
+    """
+    A file in the remote directory listing.
+
+    `modify` is in seconds since the epoch on the local clock, `None` where the listing gave no usable time.
+    `sha256` is only filled when hashes were requested and the server supports them.
+    """
+
+    size: int | None
+    modify: float | None
+    sha256: str | None
+
+
+def parse_mlsd_time(value: str) -> float:
+    """
+    Convert an MLSD `modify` fact (YYYYMMDDHHMMSS[.sss], UTC) to seconds since the epoch.
+    """
+    whole_seconds, _, fraction = value.partition(".")
+    timestamp = calendar.timegm(time.strptime(whole_seconds, "%Y%m%d%H%M%S"))
+    if fraction:
+        timestamp += float(f"0.{fraction}")
+    return timestamp
+
+
+def get_parent_directories(remote_name: str) -> list[str]:
+    """
+    List the directories containing a remote file, outermost first, e.g. `a`, `a/b` for `a/b/c.htm`.
+    """
+    parts = remote_name.split("/")[:-1]
+    return ["/".join(parts[: depth + 1]) for depth in range(len(parts))]
+
+
+class ChunkReader(io.RawIOBase):
+    """
+    Read-only file object over an iterable of byte chunks.
+
+    Lets `storbinary` pull generated data block by block, so a transfer never holds more than one chunk in memory.
+    An error reading the chunks, such as the local file being deleted or locked, ends the data early and is kept in
+    `read_error`, so it is not mistaken for a failure of the connection, which stays usable.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        super().__init__()
+        self.chunks = iter(chunks)
+        self.leftover = b""
+        self.bytes_read = 0
+        self.read_error: OSError | None = None
+
+    def readable(self):
+        return True
+
+    def tell(self) -> int:
+        return self.bytes_read
+
+    def readinto(self, buffer) -> int:
+        while len(self.leftover) == 0:
+            try:
+                chunk = next(self.chunks, None)
+            except OSError as e:
+                self.read_error = e
+                return 0
+            if chunk is None:
+                return 0
+            self.leftover = chunk
+        n_bytes = min(len(buffer), len(self.leftover))
+        buffer[:n_bytes] = self.leftover[:n_bytes]
+        self.leftover = self.leftover[n_bytes:]
+        self.bytes_read += n_bytes
+        return n_bytes
+
+    def close(self):
+        close_chunks = getattr(self.chunks, "close", None)
+        if close_chunks is not None:
+            close_chunks()
+        super().close()
 
 
 class FtpConnection:
@@ -46,13 +130,168 @@ class FtpConnection:
             new_file = io.BytesIO()
             new_file.write(b".")
             new_file.seek(0)
-            self.connection.storbinary("STOR .keep", new_file)
+            self.connection.storbinary(f"STOR {KEEPALIVE_FILENAME}", new_file)
             LOGGER.info(f"Sent keepalive signal")
             new_file.close()
         except ftplib.all_errors as e:
             LOGGER.critical(f"Keepalive signal failed with following error: {e}")
             raise ConnectionError("Keepalive failed.")
 
+    def get_hash_command(self) -> str | None:
+        """
+        Return the command the server offers for SHA-256 checksums of remote files, if any.
+        """
+        try:
+            features = self.connection.sendcmd("FEAT").upper()
+        except ftplib.all_errors:
+            return None
+        for line in features.splitlines():
+            words = line.split()
+            if len(words) == 0:
+                continue
+            if words[0] == "HASH" and "SHA-256" in line:
+                try:
+                    self.connection.sendcmd("OPTS HASH SHA-256")
+                    return "HASH"
+                except ftplib.all_errors:
+                    continue
+            if words[0] == "XSHA256":
+                return "XSHA256"
+        return None
+
+    def get_remote_sha256(self, hash_command: str, filename: str) -> str | None:
+        try:
+            response = self.connection.sendcmd(f"{hash_command} {filename}")
+        except ftplib.all_errors as e:
+            LOGGER.warning(f"Could not get checksum of remote {filename}: {e}")
+            return None
+        match = SHA256_PATTERN.search(response)
+        if match is None:
+            return None
+        return match.group(0).lower()
+
+    def list_directory(self, path: str = "") -> tuple[dict[str, RemoteFile], list[str]]:
+        """
+        List the files in a directory with their sizes and modification times, and its subdirectories.
+
+        `path` and the names returned are relative to the working directory, separated by forward slashes. Uses
+        MLSD where available. Servers without it are listed with LIST, which only gives usable sizes for
+        Unix-style listings and never a modification time, as LIST times are in the server's local zone.
+        """
+        prefix = f"{path}/" if path else ""
+        listing = dict()
+        directories = []
+        try:
+            for name, facts in self.connection.mlsd(
+                path, facts=["type", "size", "modify"]
+            ):
+                if facts.get("type") == "dir":
+                    directories.append(f"{prefix}{name}")
+                if facts.get("type") != "file":
+                    continue
+                size = facts.get("size")
+                modify = facts.get("modify")
+                listing[f"{prefix}{name}"] = RemoteFile(
+                    int(size) if size is not None else None,
+                    parse_mlsd_time(modify) if modify is not None else None,
+                    None,
+                )
+        except ftplib.error_perm:
+            lines = []
+            self.connection.retrlines(f"LIST {path}".rstrip(), lines.append)
+            for line in lines:
+                fields = line.split(None, 8)
+                if len(fields) != 9:
+                    continue
+                if fields[0].startswith("d") and fields[8] not in (".", ".."):
+                    directories.append(f"{prefix}{fields[8]}")
+                elif fields[0].startswith("-"):
+                    size = int(fields[4]) if fields[4].isdigit() else None
+                    listing[f"{prefix}{fields[8]}"] = RemoteFile(size, None, None)
+        return listing, directories
+
+    def get_remote_snapshot(
+        self, fetch_hashes: bool, known_directories: set[str] | None = None
+    ) -> dict[str, RemoteFile]:
+        """
+        Take a snapshot of the files already in the remote directory and its subdirectories.
+
+        A keepalive file is written first so its modification time (from MDTM) gives the offset between the
+        server and local clocks, and all modification times are returned on the local clock. Times are dropped
+        if the clocks cannot be compared. When `fetch_hashes` is set and the server supports HASH or XSHA256,
+        each file's SHA-256 is also fetched, at one round trip per file. The subdirectories found are added to
+        `known_directories`, so uploads into them need no MKD.
+        """
+        self.keepalive()
+        keepalive_time = time.time()
+        listing, directories = self.list_directory()
+        listing.pop(KEEPALIVE_FILENAME, None)
+        while len(directories) > 0:
+            directory = directories.pop()
+            if known_directories is not None:
+                known_directories.add(directory)
+            try:
+                files, subdirectories = self.list_directory(directory)
+            except ftplib.error_perm as e:
+                LOGGER.warning(f"Could not list remote directory {directory}: {e}")
+                continue
+            listing.update(files)
+            directories += subdirectories
+
+        try:
+            response = self.connection.sendcmd(f"MDTM {KEEPALIVE_FILENAME}")
+            clock_offset = parse_mlsd_time(response.split()[-1]) - keepalive_time
+        except ftplib.all_errors + (ValueError,) as e:
+            LOGGER.warning(f"Could not compare server and local clocks: {e}")
+            clock_offset = None
+
+        for name, remote_file in listing.items():
+            if remote_file.modify is None:
+                continue
+            if clock_offset is None:
+                listing[name] = remote_file._replace(modify=None)
+            else:
+                listing[name] = remote_file._replace(
+                    modify=remote_file.modify - clock_offset
+                )
+
+        if fetch_hashes:
+            hash_command = self.get_hash_command()
+            if hash_command is None:
+                LOGGER.warning("Server does not support HASH or XSHA256.")
+            else:
+                for name, remote_file in listing.items():
+                    listing[name] = remote_file._replace(
+                        sha256=self.get_remote_sha256(hash_command, name)
+                    )
+
+        LOGGER.info(f"Remote snapshot found {len(listing)} files.")
+        return listing
+
+    def make_directories(self, remote_name: str, known_directories: set[str]):
+        """
+        Create the remote directories a file is uploaded into, with one MKD for each not known to exist.
+
+        Directories are added to `known_directories` once created. A refused MKD is taken to mean the directory
+        already exists, as most servers refuse to create an existing directory; if it does not, the upload into
+        it fails instead.
+        """
+        for directory in get_parent_directories(remote_name):
+            if directory in known_directories:
+                continue
+            try:
+                self.connection.mkd(directory)
+                LOGGER.info(f"Created remote directory {directory}")
+            except ftplib.error_perm:
+                pass
+            except ftplib.all_errors as e:
+                LOGGER.error(
+                    f"Failed to create remote directory {directory} with following error: {e}",
+                    exc_info=False,
+                )
+                raise ConnectionError(f"Failed to create {directory}.")
+            known_directories.add(directory)
+
     def set_working_directory(self, remote_directory: str):
         try:
             self.connection.cwd(remote_directory)
@@ -64,9 +303,16 @@ class FtpConnection:
             )
             raise ConnectionError(f"Failed to set working directory.")
 
-    def upload(self, filename: str, file_object: io.BytesIO):
+    def upload(
+        self,
+        filename: str,
+        file_object: BinaryIO,
+        blocksize: int = UPLOAD_BLOCK_SIZE,
+    ):
         try:
-            self.connection.storbinary(f"STOR {filename}", file_object)
+            self.connection.storbinary(
+                f"STOR {filename}", file_object, blocksize=blocksize
+            )
             LOGGER.info(f"Uploaded {filename} to remote.")
         except ftplib.all_errors as e:
             LOGGER.error(
@@ -75,6 +321,24 @@ class FtpConnection:
             )
             raise ConnectionError(f"Failed to upload {filename}.")
 
+    def delete(self, filename: str) -> bool:
+        """
+        Delete a remote file, returning False if the server refused, usually because the file is not there.
+        """
+        try:
+            self.connection.delete(filename)
+            LOGGER.info(f"Deleted {filename} from remote.")
+            return True
+        except ftplib.error_perm as e:
+            LOGGER.info(f"Did not delete {filename} from remote: {e}")
+            return False
+        except ftplib.all_errors as e:
+            LOGGER.error(
+                f"Failed to delete {filename} from remote with following error: {e}",
+                exc_info=False,
+            )
+            raise ConnectionError(f"Failed to delete {filename}.")
+
     def close(self):
         try:
             self.connection.quit()
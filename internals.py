@@ -1,44 +1,473 @@
-from PySide6.QtGui import QStandardItemModel, QStandardItem
+from PySide6.QtCore import (
+    QAbstractListModel,
+    QModelIndex,
+    QTimer,
+    Qt,
+    Signal,
+    Slot,
+)
 import os
+import heapq
+import itertools
+import re
 import json
+import logging
+
+import editor
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_FTP_SESSIONS = 3
+DEFAULT_EDIT_CACHE_MB = 32
+DEFAULT_EDIT_CACHE_DISK_MB = 256
+# "native" watches folders through notifications from the operating system, "polling" by listing them.
+WATCHER_MODES = ("native", "polling")
 
 
 class QueueEntry:
+    __slots__ = (
+        "full_path",
+        "basename",
+        "action",
+        "time_added",
+        "in_progress",
+        "future",
+        "session_id",
+        "ready_at",
+        "schedule_id",
+        "check_time",
+        "attempts",
+        "queue",
+    )
     check_time_entries = ("OF.htm",)
 
-    def __init__(self, filepath: str, add_time: int, action: str):
+    def __init__(
+        self,
+        filepath: str,
+        add_time: int,
+        action: str,
+        queue: "FilesystemQueue | None" = None,
+    ):
         self.full_path = filepath
         self.basename = os.path.basename(filepath)
         self.action = action
         self.time_added = add_time
-        self.standard_item = QStandardItem(self.basename)
         self.in_progress = False
         self.future = False
+        self.session_id: int | None = None
+        # Time in ms since epoch the entry is due, or None if waiting will not make it due.
+        self.ready_at: int | None = None
+        self.schedule_id: int | None = None
         if self.full_path.endswith(self.check_time_entries):
             self.check_time = True
         else:
             self.check_time = False
+        self.attempts = 0
+        self.queue = queue
 
-    def set_in_progress(self):
-        self.in_progress = True
+    def __str__(self):
+        if self.in_progress is True and self.session_id is not None:
+            return f"📨[{self.session_id + 1}] {self.basename}"
+        if self.action == "delete":
+            return f"🗑{self.basename}"
+        if self.future is True:
+            return f"⏳{self.basename}"
+        return self.basename
+
+    def set_state(self, in_progress: bool, future: bool, session_id: int | None):
+        if self.queue is not None:
+            self.queue.count_state_change(self, in_progress, future)
+        self.in_progress = in_progress
+        self.future = future
+        self.session_id = session_id
+
+    def set_in_progress(self, session_id: int | None = None):
+        self.attempts += 1
+        self.set_state(True, self.future, session_id)
+        # Journalled before the entry is sent, so attempts cut short by a crash are counted.
+        if self.queue is not None:
+            self.queue.journal_record(self.to_record())
 
     def set_stalled(self):
-        self.in_progress = False
+        self.set_state(False, self.future, None)
 
     def set_future(self):
-        self.future = True
+        self.set_state(self.in_progress, True, self.session_id)
 
     def unset_future(self):
-        self.future = False
+        self.set_state(self.in_progress, False, self.session_id)
 
     def get_is_future(self):
         return self.future
 
+    def to_record(self) -> dict:
+        return {
+            "path": self.full_path,
+            "action": self.action,
+            "time_added": self.time_added,
+            "ready_at": self.ready_at,
+            "attempts": self.attempts,
+        }
+
+
+class QueueModel(QAbstractListModel):
+    """
+    List model showing the entries of a `FilesystemQueue`, newest first.
+
+    Changes are collected and applied to the view together at most every `update_interval` ms, as one removal
+    per run of adjacent rows, one insertion for the new entries and one change covering the relabelled rows,
+    so a burst of thousands of events does not update the view for each one. Entries and their labels are
+    only read when the view draws their rows.
+    """
+
+    counts_changed = Signal()
+    update_interval = 100
+    # Past this many separate runs of removed rows, the view is reset instead.
+    max_row_operations = 50
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows: list[QueueEntry] = []
+        self.added_entries: list[QueueEntry] = []
+        self.removed_entries: set[QueueEntry] = set()
+        self.changed_entries: set[QueueEntry] = set()
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.timeout.connect(self.apply_changes)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return str(self.rows[index.row()])
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self.rows[index.row()].full_path
+        return None
+
+    def entry_added(self, queue_entry: QueueEntry):
+        self.added_entries.append(queue_entry)
+        self.request_update()
+
+    def entry_removed(self, queue_entry: QueueEntry):
+        self.removed_entries.add(queue_entry)
+        self.request_update()
+
+    def entry_changed(self, queue_entry: QueueEntry):
+        self.changed_entries.add(queue_entry)
+        self.request_update()
+
+    def request_update(self):
+        if not self.update_timer.isActive():
+            self.update_timer.start(self.update_interval)
+
+    @Slot()
+    def apply_changes(self):
+        new_entries = [
+            entry
+            for entry in reversed(self.added_entries)
+            if entry not in self.removed_entries
+        ]
+        removed_runs = []
+        if len(self.removed_entries) > 0:
+            for row, entry in enumerate(self.rows):
+                if entry not in self.removed_entries:
+                    continue
+                if len(removed_runs) > 0 and removed_runs[-1][1] == row - 1:
+                    removed_runs[-1][1] = row
+                else:
+                    removed_runs.append([row, row])
+
+        if len(removed_runs) > self.max_row_operations:
+            self.beginResetModel()
+            self.rows = new_entries + [
+                entry for entry in self.rows if entry not in self.removed_entries
+            ]
+            self.endResetModel()
+        else:
+            for first, last in reversed(removed_runs):
+                self.beginRemoveRows(QModelIndex(), first, last)
+                del self.rows[first : last + 1]
+                self.endRemoveRows()
+            if len(new_entries) > 0:
+                self.beginInsertRows(QModelIndex(), 0, len(new_entries) - 1)
+                self.rows[0:0] = new_entries
+                self.endInsertRows()
+
+        changed_entries = self.changed_entries - self.removed_entries
+        if len(changed_entries) > 0:
+            changed_rows = [
+                row for row, entry in enumerate(self.rows) if entry in changed_entries
+            ]
+            if len(changed_rows) > 0:
+                self.dataChanged.emit(
+                    self.index(changed_rows[0]), self.index(changed_rows[-1])
+                )
+
+        self.added_entries = []
+        self.removed_entries = set()
+        self.changed_entries = set()
+        self.counts_changed.emit()
+
+    def clear(self):
+        self.update_timer.stop()
+        self.beginResetModel()
+        self.rows = []
+        self.added_entries = []
+        self.removed_entries = set()
+        self.changed_entries = set()
+        self.endResetModel()
+        self.counts_changed.emit()
+
+
+class FtpSession:
+    """
+    Health and progress of a single session in the FTP upload pool.
+    """
+
+    connecting = "connecting"
+    idle = "idle"
+    busy = "busy"
+    failed = "failed"
+
+    def __init__(self, session_id: int):
+        self.session_id = session_id
+        self.state = self.connecting
+        self.current_file: str | None = None
+        # Files whose remote copies are being deleted, when deleting rather than uploading.
+        self.current_deletions: list[str] = []
+        self.uploads_completed = 0
+        self.uploads_unchanged = 0
+        self.deletions_completed = 0
+        self.reconnect_attempts = 0
+        self.last_activity: int | None = None
+        self.busy_since: int | None = None
+
+    def __str__(self):
+        if self.state == self.busy and self.current_file is not None:
+            state = f"uploading {os.path.basename(self.current_file)}"
+        elif self.state == self.busy:
+            state = f"deleting {len(self.current_deletions)} files"
+        else:
+            state = self.state
+        return (
+            f"Session {self.session_id + 1}: {state}, {self.uploads_completed} uploaded, "
+            f"{self.uploads_unchanged} unchanged, {self.deletions_completed} deleted"
+        )
+
+    def set_idle(self, activity_time: int):
+        # A transfer finishing shows the connection is sound again, whether or not the file could be sent.
+        if self.state == self.busy:
+            self.reconnect_attempts = 0
+        self.state = self.idle
+        self.current_file = None
+        self.current_deletions = []
+        self.last_activity = activity_time
+
+    def set_busy(self, filepath: str, start_time: int):
+        self.state = self.busy
+        self.current_file = filepath
+        self.busy_since = start_time
+
+    def set_deleting(self, filepaths: list[str], start_time: int):
+        self.state = self.busy
+        self.current_deletions = filepaths
+        self.busy_since = start_time
+
+    def set_reconnecting(self):
+        self.state = self.connecting
+        self.current_file = None
+        self.current_deletions = []
+        self.reconnect_attempts += 1
+
+    def set_failed(self):
+        self.state = self.failed
+        self.current_file = None
+        self.current_deletions = []
+
+    def is_idle(self) -> bool:
+        return self.state == self.idle
+
+    def is_alive(self) -> bool:
+        return self.state != self.failed
+
+
+class FileWrite:
+    __slots__ = ("last_event", "events", "longest_pause", "closed", "probe_stat")
+
+    def __init__(self, event_time: int):
+        self.last_event = event_time
+        self.events = 0
+        # Longest time in ms between two events of this write.
+        self.longest_pause = 0
+        self.closed = False
+        # Size and modification time when the file was last found incomplete.
+        self.probe_stat: tuple[int, int] | None = None
+
+
+class WriteTracker:
+    """
+    Decides when files being written are complete, learning how long writes pause for by file extension.
+
+    A file is complete once it has gone unmodified for the debounce of its extension, or is unchanged since it
+    was last probed, and it is not locked by another process. A close-write event, where the watcher sends one,
+    ends the wait early. The debounce of each extension follows the longest pauses seen between the events of
+    writes, and is lengthened straight away when a file found complete is written to again within twice its
+    debounce.
+    """
+
+    min_debounce = 250
+    max_debounce = 10_000
+    pause_margin = 2
+    learning_rate = 0.25
+
+    def __init__(self, default_debounce: int):
+        self.default_debounce = default_debounce
+        self.debounces: dict[str, float] = dict()
+        self.writes: dict[str, FileWrite] = dict()
+        # Filepath -> time of the last event of writes found complete, to catch those that were not.
+        self.completed: dict[str, int] = dict()
+
+    def get_debounce(self, filepath: str) -> int:
+        extension = os.path.splitext(filepath)[1].lower()
+        return round(self.debounces.get(extension, self.default_debounce))
+
+    def learn(self, filepath: str, pause: int, at_least: bool = False):
+        extension = os.path.splitext(filepath)[1].lower()
+        debounce = self.debounces.get(extension, self.default_debounce)
+        target = min(
+            max(pause * self.pause_margin, self.min_debounce), self.max_debounce
+        )
+        if at_least is True:
+            debounce = max(debounce, target)
+        else:
+            debounce += self.learning_rate * (target - debounce)
+        self.debounces[extension] = debounce
+
+    def record_event(self, filepath: str, event_time: int, operation: str):
+        if operation == "delete":
+            self.writes.pop(filepath, None)
+            self.completed.pop(filepath, None)
+            return
+        file_write = self.writes.get(filepath)
+        if file_write is None:
+            file_write = FileWrite(event_time)
+            self.writes[filepath] = file_write
+            completed_at = self.completed.pop(filepath, None)
+            if (
+                operation not in ("close", "rescan")
+                and completed_at is not None
+                and event_time - completed_at
+                < self.get_debounce(filepath) * self.pause_margin
+            ):
+                pause = event_time - completed_at
+                LOGGER.info(
+                    f"{os.path.basename(filepath)} was written to {pause} ms after appearing complete."
+                )
+                self.learn(filepath, pause, at_least=True)
+        if operation == "close":
+            file_write.closed = True
+            return
+        # Changes found by a rescan were not watched being written, so say nothing about pauses in writes.
+        if operation == "rescan":
+            return
+        if file_write.events > 0:
+            file_write.longest_pause = max(
+                file_write.longest_pause, event_time - file_write.last_event
+            )
+        file_write.events += 1
+        file_write.last_event = max(file_write.last_event, event_time)
+        file_write.closed = False
+
+    def get_ready_time(self, filepath: str, time_added: int) -> int:
+        """
+        Return the time in ms since epoch a file should next be probed for completion.
+        """
+        file_write = self.writes.get(filepath)
+        if file_write is None:
+            return time_added + self.get_debounce(filepath)
+        if file_write.closed is True:
+            return file_write.last_event
+        return file_write.last_event + self.get_debounce(filepath)
+
+    def probe(self, filepath: str, time_now: int) -> int | None:
+        """
+        Check whether a file is completely written, returning None if so or else the ms to wait before probing
+        again.
+
+        Raises FileNotFoundError if the file has been deleted. Files that can't be checked for other reasons are
+        treated as complete, for the upload to deal with.
+        """
+        try:
+            stat_result = os.stat(filepath)
+        except FileNotFoundError:
+            self.writes.pop(filepath, None)
+            raise
+        except OSError:
+            self.writes.pop(filepath, None)
+            return None
+        stat_key = (stat_result.st_size, stat_result.st_mtime_ns)
+        file_write = self.writes.get(filepath)
+        if file_write is None:
+            file_write = FileWrite(time_now)
+            self.writes[filepath] = file_write
+        debounce = self.get_debounce(filepath)
+
+        quiet_time = time_now - stat_result.st_mtime_ns // 1_000_000
+        if (
+            file_write.closed is False
+            and quiet_time < debounce
+            and file_write.probe_stat != stat_key
+        ):
+            file_write.probe_stat = stat_key
+            return min(debounce - max(quiet_time, 0), self.max_debounce)
+        if editor.is_file_locked(filepath):
+            file_write.probe_stat = stat_key
+            return debounce
+
+        self.writes.pop(filepath)
+        # A single event, such as for a file found by the initial checks, says nothing about pauses in writes.
+        if file_write.events > 1:
+            self.learn(filepath, file_write.longest_pause)
+        self.completed[filepath] = file_write.last_event
+        if len(self.completed) > 1000:
+            self.completed = {
+                path: completed_at
+                for path, completed_at in self.completed.items()
+                if time_now - completed_at < self.max_debounce * self.pause_margin
+            }
+        return None
+
+    def clear(self):
+        self.writes.clear()
+        self.completed.clear()
+
 
 class FilesystemQueue:
+    """
+    Queue of filesystem events, shown in an item model and ordered by when each entry is due.
+
+    Due times are kept in a min-heap, so the next entry due is found without scanning the queue. Entries are
+    not removed from the heap when rescheduled or dispatched: each push is numbered, and pushes older than the
+    latest for their entry are skipped when they reach the top.
+
+    If a journal is opened, each entry is recorded as it is scheduled, dispatched and removed, so the entries
+    left when the program stops or crashes can be restored by the next run, along with the number of times
+    they were dispatched without completing.
+    """
+
     def __init__(self):
         self.event_queue: dict[str, QueueEntry] = dict()
-        self.item_model = QStandardItemModel()
+        self.item_model = QueueModel()
+        self.future_entries = 0
+        self.in_progress_entries = 0
+        self.schedule: list[tuple[int, int, str]] = []
+        self.schedule_ids = itertools.count()
+        self.journal: editor.SaveJournal | None = None
 
     def __len__(self) -> tuple[int, int]:
         """
@@ -47,35 +476,170 @@ class FilesystemQueue:
         return self.get_queue_size()[0]
 
     def get_queue_size(self):
-        non_future_events = 0
-        future_events = 0
-        for queue_entry in self.event_queue.values():
-            if queue_entry.get_is_future() is False:
-                non_future_events += 1
-            else:
-                future_events += 1
+        return (len(self.event_queue) - self.future_entries, self.future_entries)
 
-        return (non_future_events, future_events)
+    def count_state_change(
+        self, queue_entry: QueueEntry, in_progress: bool, future: bool
+    ):
+        """
+        Update the counts of entries in progress and in the future as an entry changes state.
+        """
+        self.in_progress_entries += int(in_progress) - int(queue_entry.in_progress)
+        self.future_entries += int(future) - int(queue_entry.future)
+        self.item_model.entry_changed(queue_entry)
 
     def add_entry(self, filepath: str, add_time: int, action: str):
-        if self.event_queue.get(filepath) is None:
-            model_entry = QueueEntry(filepath, add_time, action)
-            self.event_queue[filepath] = model_entry
-            self.item_model.insertRow(0, self.event_queue[filepath].standard_item)
+        """
+        Queue an entry for a file, or update the entry already queued for it, taking the latest action.
+
+        A deletion followed by the file being created again thereby leaves a single upload, and the reverse a
+        single deletion.
+        """
+        queue_entry = self.event_queue.get(filepath)
+        if queue_entry is None:
+            queue_entry = QueueEntry(filepath, add_time, action, self)
+            self.event_queue[filepath] = queue_entry
+            self.item_model.entry_added(queue_entry)
         else:
-            self.event_queue[filepath].time_added = add_time
+            queue_entry.time_added = add_time
+            if queue_entry.action != action:
+                queue_entry.action = action
+                self.item_model.entry_changed(queue_entry)
+        return queue_entry
+
+    def set_ready_time(self, queue_entry: QueueEntry, ready_at: int | None):
+        """
+        Schedule an entry to be due at `ready_at`, replacing any earlier schedule for it.
+        """
+        queue_entry.ready_at = ready_at
+        queue_entry.schedule_id = next(self.schedule_ids)
+        self.journal_record(queue_entry.to_record())
+        if ready_at is not None:
+            heapq.heappush(
+                self.schedule,
+                (ready_at, queue_entry.schedule_id, queue_entry.full_path),
+            )
+        if len(self.schedule) > 2 * len(self.event_queue) + 64:
+            self.schedule = [
+                (entry.ready_at, entry.schedule_id, entry.full_path)
+                for entry in self.event_queue.values()
+                if entry.ready_at is not None and entry.in_progress is False
+            ]
+            heapq.heapify(self.schedule)
+
+    def peek_scheduled(self) -> QueueEntry | None:
+        """
+        Return the entry due soonest, or None if no entry can become due, dropping outdated schedules.
+        """
+        while len(self.schedule) > 0:
+            ready_at, schedule_id, filepath = self.schedule[0]
+            queue_entry = self.event_queue.get(filepath)
+            if (
+                queue_entry is not None
+                and queue_entry.schedule_id == schedule_id
+                and queue_entry.in_progress is False
+            ):
+                return queue_entry
+            heapq.heappop(self.schedule)
+        return None
+
+    def next_ready_time(self) -> int | None:
+        queue_entry = self.peek_scheduled()
+        if queue_entry is None:
+            return None
+        return queue_entry.ready_at
+
+    def pop_ready(self, time_now: int) -> QueueEntry | None:
+        """
+        Take the entry due soonest off the schedule if it is due by `time_now`.
+        """
+        queue_entry = self.peek_scheduled()
+        if queue_entry is None or queue_entry.ready_at > time_now:
+            return None
+        heapq.heappop(self.schedule)
+        return queue_entry
 
     def remove_entry(self, filepath: str):
         if filepath in self.event_queue.keys():
             entry_to_remove = self.event_queue.pop(filepath)
-            if entry_to_remove.standard_item.index().isValid():
-                self.item_model.removeRow(entry_to_remove.standard_item.row())
+            self.in_progress_entries -= int(entry_to_remove.in_progress)
+            self.future_entries -= int(entry_to_remove.future)
+            entry_to_remove.queue = None
+            self.item_model.entry_removed(entry_to_remove)
+            self.journal_record({"path": filepath, "removed": True})
+
+    def open_journal(self, filepath: str) -> list[QueueEntry]:
+        """
+        Start journalling the queue to `filepath`, first restoring the entries left in it by the last run.
+
+        Entries for files that no longer exist are dropped, as are deletions of files that exist again. Restored
+        entries keep the time they were added and their number of attempts, but are not scheduled.
+        """
+        self.journal = editor.SaveJournal(filepath)
+        records = dict()
+        for record in self.journal.read():
+            if record.get("removed") is True:
+                records.pop(record["path"], None)
+            else:
+                records[record["path"]] = record
+        restored_entries = []
+        for record in records.values():
+            if record["action"] == "delete":
+                if os.path.exists(record["path"]):
+                    continue
+            elif not os.path.isfile(record["path"]):
+                continue
+            queue_entry = self.add_entry(
+                record["path"], record["time_added"], record["action"]
+            )
+            queue_entry.attempts = record["attempts"]
+            restored_entries.append(queue_entry)
+        self.compact_journal()
+        return restored_entries
+
+    def journal_record(self, record: dict):
+        if self.journal is None:
+            return
+        try:
+            self.journal.append(record)
+            if self.journal.records > 2 * len(self.event_queue) + 1000:
+                self.compact_journal()
+        except OSError as e:
+            LOGGER.warning(f"Could not journal upload queue: {e}")
+
+    def compact_journal(self):
+        """
+        Rewrite the journal with one record for each entry in the queue, or remove it if the queue is empty.
+        """
+        if len(self.event_queue) == 0:
+            self.journal.clear()
+            return
+        self.journal.rewrite(
+            [queue_entry.to_record() for queue_entry in self.event_queue.values()]
+        )
+
+    def close_journal(self):
+        """
+        Compact and close the journal, keeping the entries still queued for the next run.
+        """
+        if self.journal is None:
+            return
+        try:
+            self.compact_journal()
+        except OSError as e:
+            LOGGER.warning(f"Could not journal upload queue: {e}")
+        self.journal.close()
+        self.journal = None
 
     def clear(self):
-        keys = list(self.event_queue.keys())
-        for key in keys:
-            self.event_queue.pop(key)
+        self.close_journal()
+        for queue_entry in self.event_queue.values():
+            queue_entry.queue = None
+        self.event_queue = dict()
+        self.future_entries = 0
+        self.in_progress_entries = 0
         self.item_model.clear()
+        self.schedule = []
 
 
 class Configuration:
@@ -95,8 +659,23 @@ class Configuration:
         self.edits_filepath: str | None = None
         self.save_filepath: str | None = None
         self.copy_pdfs: bool | None = None
+        self.ftp_sessions: int = DEFAULT_FTP_SESSIONS
+        self.remote_snapshot: bool = True
+        self.remote_hash_check: bool = False
+        self.normalisation_rules: list[str] = []
+        self.edits_mode: str = editor.ReplacementEngine.exact
+        self.edit_cache_mb: int = DEFAULT_EDIT_CACHE_MB
+        self.edit_cache_policy: str = "lru"
+        self.edit_cache_folder: str | None = None
+        self.edit_cache_disk_mb: int = DEFAULT_EDIT_CACHE_DISK_MB
+        self.hash_algorithm: str = "sha256"
+        self.pdf_upload_mode: str = "copy"
+        self.watcher_mode: str = "native"
+        self.remote_deletion: bool = False
 
         self.edits_dict: dict[str, str] = dict()
+        self.edits_engine = editor.ReplacementEngine(self.edits_dict)
+        self.compiled_normalisation_rules: list[re.Pattern] = []
 
         self.key_hostname: str = "hostname"
         self.key_port: str = "port"
@@ -109,6 +688,19 @@ class Configuration:
         self.key_edits_filepath: str = "edits_file"
         self.key_save_filepath: str = "save_file"
         self.key_copy_pdfs: str = "copy_pdfs"
+        self.key_ftp_sessions: str = "ftp_sessions"
+        self.key_remote_snapshot: str = "remote_snapshot"
+        self.key_remote_hash_check: str = "remote_hash_check"
+        self.key_normalisation_rules: str = "normalisation_rules"
+        self.key_edits_mode: str = "edits_mode"
+        self.key_edit_cache_mb: str = "edit_cache_mb"
+        self.key_edit_cache_policy: str = "edit_cache_policy"
+        self.key_edit_cache_folder: str = "edit_cache_folder"
+        self.key_edit_cache_disk_mb: str = "edit_cache_disk_mb"
+        self.key_hash_algorithm: str = "hash_algorithm"
+        self.key_pdf_upload_mode: str = "pdf_upload_mode"
+        self.key_watcher_mode: str = "watcher_mode"
+        self.key_remote_deletion: str = "remote_deletion"
 
     def __str__(self):
         return "\n".join(
@@ -124,6 +716,17 @@ class Configuration:
                 f"Edits file: {self.edits_filepath}"
                 f"Save state file: {self.save_filepath}"
                 f"Copy PDFs? {self.copy_pdfs}"
+                f"FTP sessions: {self.ftp_sessions}"
+                f"Skip files already on remote? {self.remote_snapshot}"
+                f"Compare remote checksums? {self.remote_hash_check}"
+                f"Normalisation rules: {self.normalisation_rules}"
+                f"Edits mode: {self.edits_mode}"
+                f"Edit cache: {self.edit_cache_mb} MB ({self.edit_cache_policy})"
+                f"Edit cache folder: {self.edit_cache_folder} ({self.edit_cache_disk_mb} MB)"
+                f"Hash algorithm: {self.hash_algorithm}"
+                f"PDF upload mode: {self.pdf_upload_mode}"
+                f"Watcher mode: {self.watcher_mode}"
+                f"Delete removed files from remote? {self.remote_deletion}"
             ]
         )
 
@@ -140,9 +743,25 @@ class Configuration:
         edits_filepath: str,
         save_filepath: str,
         copy_pdfs: bool,
+        ftp_sessions: int = DEFAULT_FTP_SESSIONS,
+        remote_snapshot: bool = True,
+        remote_hash_check: bool = False,
+        normalisation_rules: list[str] | None = None,
+        edits_mode: str = editor.ReplacementEngine.exact,
+        edit_cache_mb: int = DEFAULT_EDIT_CACHE_MB,
+        edit_cache_policy: str = "lru",
+        edit_cache_folder: str | None = None,
+        edit_cache_disk_mb: int = DEFAULT_EDIT_CACHE_DISK_MB,
+        hash_algorithm: str = "sha256",
+        pdf_upload_mode: str = "copy",
+        watcher_mode: str = "native",
+        remote_deletion: bool = False,
     ):
         """
         Set properties of a `Configuration` object from in memory variables.
+
+        Settings after `copy_pdfs` have no field in the main window and are only set through the JSON
+        configuration file, so they take default values when omitted.
         """
         if "" in [hostname, local_website_dir, remote_dir]:
             raise ValueError(
@@ -176,6 +795,64 @@ class Configuration:
             self.save_filepath = os.path.abspath(str(save_filepath))
 
         self.copy_pdfs = bool(copy_pdfs)
+        self.ftp_sessions = max(1, int(ftp_sessions))
+        self.remote_snapshot = bool(remote_snapshot)
+        self.remote_hash_check = bool(remote_hash_check)
+
+        if normalisation_rules is None:
+            self.normalisation_rules = []
+        else:
+            self.normalisation_rules = [str(rule) for rule in normalisation_rules]
+        self.compiled_normalisation_rules = editor.compile_normalisation_rules(
+            self.normalisation_rules
+        )
+
+        self.edits_mode = str(edits_mode)
+        self.edits_engine = editor.ReplacementEngine(self.edits_dict, self.edits_mode)
+
+        self.edit_cache_mb = max(0, int(edit_cache_mb))
+        self.edit_cache_policy = str(edit_cache_policy)
+        if edit_cache_folder in ["", None]:
+            self.edit_cache_folder = None
+        else:
+            self.edit_cache_folder = os.path.abspath(str(edit_cache_folder))
+        self.edit_cache_disk_mb = max(0, int(edit_cache_disk_mb))
+
+        # Fails early for unknown algorithms, or xxh3_128 without xxhash installed
+        editor.new_hash(hash_algorithm)
+        self.hash_algorithm = str(hash_algorithm)
+
+        if pdf_upload_mode not in editor.PDF_UPLOAD_MODES:
+            raise ValueError(
+                f"Unknown PDF upload mode {pdf_upload_mode!r}, expected one of {editor.PDF_UPLOAD_MODES}"
+            )
+        self.pdf_upload_mode = str(pdf_upload_mode)
+
+        if watcher_mode not in WATCHER_MODES:
+            raise ValueError(
+                f"Unknown watcher mode {watcher_mode!r}, expected one of {WATCHER_MODES}"
+            )
+        self.watcher_mode = str(watcher_mode)
+
+        self.remote_deletion = bool(remote_deletion)
+
+    def create_edit_cache(self) -> editor.EditCache | None:
+        """
+        Create an empty cache of edited files with the configured limits, reloading the disk tier if any.
+
+        Returns None when neither tier may hold anything, so files are not hashed to look up a cache that is
+        always empty.
+        """
+        if self.edit_cache_mb == 0 and (
+            self.edit_cache_folder is None or self.edit_cache_disk_mb == 0
+        ):
+            return None
+        return editor.EditCache(
+            self.edit_cache_mb * 1_000_000,
+            self.edit_cache_policy,
+            self.edit_cache_folder,
+            self.edit_cache_disk_mb * 1_000_000,
+        )
 
     def from_json(self, json_filepath: str):
         """
@@ -198,6 +875,25 @@ class Configuration:
             config_file[self.key_edits_filepath],
             config_file[self.key_save_filepath],
             config_file[self.key_copy_pdfs],
+            ftp_sessions=config_file.get(self.key_ftp_sessions, DEFAULT_FTP_SESSIONS),
+            remote_snapshot=config_file.get(self.key_remote_snapshot, True),
+            remote_hash_check=config_file.get(self.key_remote_hash_check, False),
+            normalisation_rules=config_file.get(self.key_normalisation_rules, []),
+            edits_mode=config_file.get(
+                self.key_edits_mode, editor.ReplacementEngine.exact
+            ),
+            edit_cache_mb=config_file.get(
+                self.key_edit_cache_mb, DEFAULT_EDIT_CACHE_MB
+            ),
+            edit_cache_policy=config_file.get(self.key_edit_cache_policy, "lru"),
+            edit_cache_folder=config_file.get(self.key_edit_cache_folder, None),
+            edit_cache_disk_mb=config_file.get(
+                self.key_edit_cache_disk_mb, DEFAULT_EDIT_CACHE_DISK_MB
+            ),
+            hash_algorithm=config_file.get(self.key_hash_algorithm, "sha256"),
+            pdf_upload_mode=config_file.get(self.key_pdf_upload_mode, "copy"),
+            watcher_mode=config_file.get(self.key_watcher_mode, "native"),
+            remote_deletion=config_file.get(self.key_remote_deletion, False),
         )
 
     def to_dict(self):
@@ -216,4 +912,17 @@ class Configuration:
             self.key_edits_filepath: self.edits_filepath,
             self.key_save_filepath: self.save_filepath,
             self.key_copy_pdfs: self.copy_pdfs,
+            self.key_ftp_sessions: self.ftp_sessions,
+            self.key_remote_snapshot: self.remote_snapshot,
+            self.key_remote_hash_check: self.remote_hash_check,
+            self.key_normalisation_rules: self.normalisation_rules,
+            self.key_edits_mode: self.edits_mode,
+            self.key_edit_cache_mb: self.edit_cache_mb,
+            self.key_edit_cache_policy: self.edit_cache_policy,
+            self.key_edit_cache_folder: self.edit_cache_folder,
+            self.key_edit_cache_disk_mb: self.edit_cache_disk_mb,
+            self.key_hash_algorithm: self.hash_algorithm,
+            self.key_pdf_upload_mode: self.pdf_upload_mode,
+            self.key_watcher_mode: self.watcher_mode,
+            self.key_remote_deletion: self.remote_deletion,
         }
@@ -41,7 +41,13 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Signal, Slot, QDateTime, Qt, QThread, QTimer
 from PySide6.QtGui import QIcon
 
-from internals import FilesystemQueue, Configuration
+from internals import (
+    FilesystemQueue,
+    Configuration,
+    FtpSession,
+    QueueEntry,
+    WriteTracker,
+)
 import workers
 import editor
 
@@ -50,6 +56,7 @@ import os
 import json
 import logging
 import tempfile
+import time
 
 from mainWindow import Ui_MainWindow
 from timeWindow import Ui_Dialog
@@ -151,11 +158,17 @@ class TimeDialog(QDialog, Ui_Dialog):
 class MainWindow(QMainWindow, Ui_MainWindow):
     signal_copy_pdf = Signal(str)
     signal_upload_file = Signal(str, int)
+    signal_delete_files = Signal(list, int)
     signal_ftp_connect = Signal()
-    signal_ftp_keepalive = Signal()
+    signal_ftp_reconnect = Signal(int)
+    signal_ftp_keepalive = Signal(int)
     signal_write_save = Signal(QDateTime)
     signal_create_panel_dict = Signal()
-    signal_initial_folder_read = Signal()
+    signal_initial_folder_read = Signal(dict)
+    signal_scan_folders = Signal()
+    signal_record_upload = Signal(str, QDateTime)
+    signal_record_deletions = Signal(list)
+    signal_remote_snapshot = Signal(int)
 
     def __init__(self):
         super().__init__()
@@ -179,8 +192,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.pdf_copier_object = None
         self.copy_timer = None
         self.upload_timer = None
-        self.ftp_uploader_object = None
-        self.ftp_uploader_thread = None
+        self.ftp_uploader_objects: list[workers.FtpUploader] = []
+        self.ftp_uploader_threads: list[QThread] = []
+        self.ftp_sessions: list[FtpSession] = []
+        self.sent_hashes: dict[str, str] = dict()
+        self.sent_stats: dict[str, tuple[tuple[int, int, int], str]] = dict()
+        self.remote_directories: set[str] = set()
+        self.edit_cache: editor.EditCache | None = None
+        self.initial_read_requested = False
+        # Startup stages run concurrently: the initial checks wait for both the remote snapshot and the folder
+        # scan, which only starts once the watchers are running.
+        self.startup_snapshot: dict | None = None
+        self.startup_scan_requested = False
+        self.startup_started = None
+        self.snapshot_requested = None
+        self.startup_timings: dict[str, float] = dict()
+        self.first_upload_dispatched = False
         self.stop_timer = None
         self.emergency_stop_timer = None
         self.graceful_stop = False
@@ -194,9 +221,27 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.upload_queue = FilesystemQueue()
         self.copy_queue = FilesystemQueue()
 
-        self.copy_frequency = 1000
-        self.upload_frequency = 1000
         self.cool_off_period = 1000
+        # Close events are only sent for files closed after writing, so are queued like modifications, as are the
+        # changes found by rescans after event storms.
+        self.queued_operations = ("create", "modify", "move", "close", "rescan")
+        # Files are only sent once they are completely written, each queue learning how long writes pause for.
+        self.upload_write_tracker = WriteTracker(self.cool_off_period)
+        self.copy_write_tracker = WriteTracker(self.cool_off_period)
+        self.max_timer_interval = 2**31 - 1
+        # Deletions wait in case the file is written again, as when FS Manager regenerates a page, and are then
+        # sent to the server in batches, which take the deletions due within the batch window of the first.
+        self.deletion_delay = 5000
+        self.deletion_batch_window = 1000
+        self.deletion_batch_size = 100
+        # Entries that were dispatched without completing, such as when a session failed or the program crashed
+        # mid-upload, wait this long in ms per attempt, up to the maximum, so other files go first.
+        self.retry_backoff = 2000
+        self.max_retry_backoff = 60_000
+        # Sessions that fail after connecting reconnect after this long in ms per attempt, and are only taken out
+        # of the pool once out of attempts without a transfer finishing.
+        self.reconnect_delay = 5000
+        self.max_reconnects = 5
 
         self.target_pdfs = editor.TARGET_PDFS
 
@@ -246,10 +291,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.actionLicenses.triggered.connect(self.license_window.show)
         self.listViewUploadQueue.setModel(self.upload_queue.item_model)
         self.checkBoxCopyPDFs.stateChanged.connect(self.copy_pdf_checkbox_what_do)
-        self.upload_queue.item_model.rowsInserted.connect(
-            self.update_upload_queue_length
-        )
-        self.upload_queue.item_model.rowsRemoved.connect(
+        self.listViewUploadQueue.setUniformItemSizes(True)
+        self.upload_queue.item_model.counts_changed.connect(
             self.update_upload_queue_length
         )
 
@@ -276,8 +319,34 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.labelLastUpdateDeltaDisplay.setText(
                 f"{mins_component:02d}:{secs_component:02d}"
             )
-            if mins_component >= (self.config_object.timeout_mins - 1):
-                self.signal_ftp_keepalive.emit()
+        self.send_session_keepalives()
+
+    def send_session_keepalives(self):
+        """
+        Send a keepalive on any idle session that has not spoken to the server within the timeout.
+        """
+        time_now = QDateTime.currentSecsSinceEpoch()
+        for session in self.ftp_sessions:
+            if session.is_idle() and session.last_activity is not None:
+                mins_since_activity = (time_now - session.last_activity) // 60
+                if mins_since_activity >= (self.config_object.timeout_mins - 1):
+                    session.last_activity = time_now
+                    self.signal_ftp_keepalive.emit(session.session_id)
+
+    def update_connection_status(self):
+        alive_sessions = [
+            session for session in self.ftp_sessions if session.is_alive()
+        ]
+        connected_sessions = [
+            session for session in alive_sessions if session.state != session.connecting
+        ]
+        if len(connected_sessions) > 0:
+            self.labelConnectionStatusDisplay.setText(
+                f"Connected ({len(connected_sessions)}/{len(self.ftp_sessions)} sessions)"
+            )
+        self.labelConnectionStatusDisplay.setToolTip(
+            "\n".join(f"{session}" for session in self.ftp_sessions)
+        )
 
     @Slot()
     def copy_pdf_checkbox_what_do(self):
@@ -294,11 +363,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def set_custom_time(self, datetime: QDateTime):
         self.custom_upload_time = datetime
         self.labelCustomTimeDisplay.setText(datetime.toString(Qt.DateFormat.TextDate))
+        self.reschedule_upload_queue()
 
     @Slot()
     def unset_custom_time(self):
         self.custom_upload_time = None
         self.labelCustomTimeDisplay.setText("Not set (using current time)")
+        self.reschedule_upload_queue()
 
     def open_time_window(self):
         if self.time_window is None:
@@ -368,6 +439,11 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.groupBoxUploadQueue.setTitle(
                 f"Upload Queue ({current_uploads},{future_uploads})"
             )
+        self.groupBoxUploadQueue.setToolTip(
+            f"{self.upload_queue.in_progress_entries} uploading, "
+            f"{current_uploads - self.upload_queue.in_progress_entries} waiting, "
+            f"{future_uploads} waiting for their segment to start"
+        )
 
     # Business Logic
     def get_check_time(self):
@@ -392,14 +468,24 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 self.config_object.local_website_dir,
                 self.config_object.save_filepath,
                 pdf_dir,
+                self.config_object.edits_engine,
+                self.config_object.compiled_normalisation_rules,
+                self.edit_cache,
+                self.config_object.hash_algorithm,
+                self.config_object.pdf_upload_mode,
             )
-            self.differencer_object.pdf_to_copy.connect(self.receive_copy_signal)
-            self.differencer_object.file_to_upload.connect(self.receive_upload_signal)
+            self.differencer_object.pdfs_to_copy.connect(self.receive_copy_events)
+            self.differencer_object.files_to_upload.connect(self.receive_upload_events)
+            self.differencer_object.remote_matches.connect(self.receive_remote_matches)
             self.differencer_object.save_written.connect(self.reenable_run)
+            self.differencer_object.stage_completed.connect(self.record_startup_stage)
             self.differencer_object.fail_signal.connect(self.emergency_stop_uploader)
             self.differencer_object.send_panel_dictionary.connect(
                 self.receive_panel_dict
             )
+            self.differencer_object.panel_dictionary_updated.connect(
+                self.receive_panel_update
+            )
             self.differencer_object.moveToThread(self.differencer_thread)
 
             self.signal_create_panel_dict.connect(
@@ -407,14 +493,29 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             )
             self.signal_write_save.connect(self.differencer_object.create_save_file)
             self.signal_initial_folder_read.connect(self.differencer_object.run_checks)
+            self.signal_scan_folders.connect(self.differencer_object.scan_folders)
+            self.signal_record_upload.connect(self.differencer_object.record_upload)
+            self.signal_record_deletions.connect(
+                self.differencer_object.record_deletions
+            )
 
             self.differencer_thread.start()
 
     @Slot(dict)
     def receive_panel_dict(self, panels: dict[str, QDateTime]):
+        if self.accepting_signals is not True:
+            return
         self.panel_dict = panels
+        self.reschedule_upload_queue()
         self.run_uploader_phase_two()
 
+    @Slot(dict)
+    def receive_panel_update(self, panels: dict[str, QDateTime]):
+        if self.panel_dict is None:
+            return
+        self.panel_dict = panels
+        self.reschedule_upload_queue()
+
     def stop_differencer(self):
         if self.differencer_thread:
             self.differencer_thread.quit()
@@ -428,14 +529,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if self.ftp_watcher_object is None:
             self.ftp_watcher_thread = QThread()
             self.ftp_watcher_object = workers.WatcherObject(
-                self.config_object.local_website_dir, recursive=False
+                self.config_object.local_website_dir,
+                recursive=True,
+                polling=self.config_object.watcher_mode == "polling",
+            )
+            self.ftp_watcher_object.file_events.connect(self.receive_upload_events)
+            self.ftp_watcher_object.file_events.connect(
+                self.differencer_object.update_panel_dict
+            )
+            self.ftp_watcher_object.rescan_requested.connect(
+                self.differencer_object.rescan_website
             )
-            self.ftp_watcher_object.file_created.connect(self.receive_upload_signal)
-            self.ftp_watcher_object.file_modified.connect(self.receive_upload_signal)
 
             self.ftp_watcher_object.moveToThread(self.ftp_watcher_thread)
             self.ftp_watcher_thread.start()
         else:
+            self.ftp_watcher_object.stop()
             self.ftp_watcher_thread.quit()
             self.ftp_watcher_thread.wait()
             self.ftp_watcher_object.deleteLater()
@@ -445,6 +554,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def stop_ftp_filesystem_watcher(self):
         if self.ftp_watcher_object and self.ftp_watcher_thread:
+            self.ftp_watcher_object.stop()
             self.ftp_watcher_thread.quit()
             self.ftp_watcher_thread.wait()
             self.ftp_watcher_object.deleteLater()
@@ -463,9 +573,16 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 ),
                 recursive=True,
                 signal_mask=self.target_pdfs,
+                polling=self.config_object.watcher_mode == "polling",
             )
-            self.pdf_watcher_object.file_created.connect(self.receive_copy_signal)
-            self.pdf_watcher_object.file_modified.connect(self.receive_copy_signal)
+            self.pdf_watcher_object.file_events.connect(self.receive_pdf_events)
+            if self.differencer_object is not None:
+                self.pdf_watcher_object.file_events.connect(
+                    self.differencer_object.update_pdf_index
+                )
+                self.pdf_watcher_object.rescan_requested.connect(
+                    self.differencer_object.rescan_pdfs
+                )
 
             self.pdf_watcher_object.moveToThread(self.pdf_watcher_thread)
             self.pdf_watcher_thread.start()
@@ -475,6 +592,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def stop_pdf_filesystem_watcher(self):
         if self.pdf_watcher_object and self.pdf_watcher_thread:
+            self.pdf_watcher_object.stop()
             self.pdf_watcher_thread.quit()
             self.pdf_watcher_thread.wait()
             self.pdf_watcher_object.deleteLater()
@@ -486,7 +604,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if not self.pdf_copier_thread and not self.pdf_copier_object:
             self.pdf_copier_thread = QThread()
             self.pdf_copier_object = workers.PdfCopier(
-                self.config_object.local_website_dir
+                self.config_object.local_website_dir,
+                self.config_object.pdf_upload_mode == "direct_link",
             )
 
             self.signal_copy_pdf.connect(self.pdf_copier_object.copy_pdf)
@@ -496,8 +615,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.pdf_copier_thread.start()
 
             self.copy_timer = QTimer(self)
+            self.copy_timer.setSingleShot(True)
             self.copy_timer.timeout.connect(self.dispatch_copy_signals)
-            self.copy_timer.start(self.copy_frequency)
+            self.dispatch_copy_signals()
 
     def stop_pdf_copier(self):
         if self.pdf_copier_thread:
@@ -511,132 +631,482 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.pdf_copier_thread = None
             self.pdf_copier_object = None
 
-    def append_filesystem_signal(
-        self,
-        item_model: FilesystemQueue,
-        filepath: str,
-        signal_time: QDateTime,
-        operation: str,
-    ):
-        signal_time_ms = signal_time.currentMSecsSinceEpoch()
-        item_model.add_entry(filepath, signal_time_ms, operation)
-
-    @Slot(str, QDateTime, str)
-    def receive_copy_signal(
-        self, filepath: str, signal_time: QDateTime, operation: str
-    ):
-        if self.accepting_signals is True:
-            self.append_filesystem_signal(
-                self.copy_queue, filepath, signal_time, operation
-            )
+    def arm_queue_timer(self, timer: QTimer, item_model: FilesystemQueue):
+        """
+        Start a single shot timer for the next entry of a queue to become due, or stop it if there is none.
+        """
+        ready_at = item_model.next_ready_time()
+        if ready_at is None:
+            timer.stop()
+        else:
+            delay = ready_at - QDateTime.currentMSecsSinceEpoch()
+            timer.start(min(max(0, delay), self.max_timer_interval))
+
+    def remove_deleted_entry(self, queue: FilesystemQueue, filepath: str):
+        """
+        Drop a queued entry for a file that has been deleted, unless it is already being sent.
+        """
+        queue_entry = queue.event_queue.get(filepath)
+        if queue_entry is not None and queue_entry.in_progress is False:
+            queue.remove_entry(filepath)
+
+    @Slot(list)
+    def receive_copy_events(self, events: list[tuple[str, int, str]]):
+        if self.accepting_signals is not True:
+            return
+        for filepath, event_time, operation in events:
+            self.copy_write_tracker.record_event(filepath, event_time, operation)
+            if operation == "delete":
+                self.remove_deleted_entry(self.copy_queue, filepath)
+                continue
+            if operation not in self.queued_operations:
+                continue
+            queue_entry = self.copy_queue.add_entry(filepath, event_time, operation)
+            if queue_entry.in_progress is False:
+                self.copy_queue.set_ready_time(
+                    queue_entry,
+                    self.copy_write_tracker.get_ready_time(
+                        filepath, queue_entry.time_added
+                    ),
+                )
+        self.dispatch_copy_signals()
+
+    @Slot(list)
+    def receive_pdf_events(self, events: list[tuple[str, int, str]]):
+        """
+        Queue PDFs from FS Manager for copying, or for upload under their own names when uploading directly.
+        """
+        if self.config_object.pdf_upload_mode == "copy":
+            self.receive_copy_events(events)
+            return
+        self.receive_upload_events(events)
+        if self.config_object.pdf_upload_mode == "direct_link":
+            self.receive_copy_events(events)
 
     @Slot()
     def dispatch_copy_signals(self):
-        for value in self.copy_queue.event_queue.values():
-            time_now = QDateTime.currentMSecsSinceEpoch()
-            if ((time_now - value.time_added) >= self.cool_off_period) and (
-                value.in_progress is False
-            ):
-                value.set_in_progress()
-                self.signal_copy_pdf.emit(value.full_path)
+        if self.copy_timer is None:
+            return
+        time_now = QDateTime.currentMSecsSinceEpoch()
+        while (value := self.copy_queue.pop_ready(time_now)) is not None:
+            try:
+                wait = self.copy_write_tracker.probe(value.full_path, time_now)
+            except FileNotFoundError:
+                self.copy_queue.remove_entry(value.full_path)
+                continue
+            if wait is not None:
+                self.copy_queue.set_ready_time(value, time_now + wait)
+                continue
+            value.set_in_progress()
+            self.signal_copy_pdf.emit(value.full_path)
+        self.arm_queue_timer(self.copy_timer, self.copy_queue)
 
     @Slot(str)
     def remove_copy_queue_entry(self, filepath: str):
         self.copy_queue.remove_entry(filepath)
 
     def start_ftp_uploader(self):
-        self.ftp_uploader_object = workers.FtpUploader(
-            self.config_object.hostname,
-            self.config_object.port,
-            self.config_object.username,
-            self.config_object.password,
-            self.config_object.remote_dir,
-            self.config_object.edits_dict,
-            False,
-        )
-        self.signal_ftp_connect.connect(
-            self.ftp_uploader_object.initiate_ftp_connection
-        )
-        self.ftp_uploader_object.connection_successful_signal.connect(
-            self.enable_stop_uploader
-        )
-        self.ftp_uploader_object.give_up_signal.connect(self.emergency_stop_uploader)
-        self.ftp_uploader_object.upload_successful.connect(
-            self.remove_upload_queue_entry
-        )
-        self.signal_ftp_keepalive.connect(
-            self.ftp_uploader_object.send_keepalive_signal
-        )
-        self.ftp_uploader_object.keepalive_successful.connect(
-            self.receive_successful_keepalive
-        )
-        self.signal_upload_file.connect(self.ftp_uploader_object.upload_file)
+        self.initial_read_requested = False
+        self.sent_hashes = dict()
+        self.sent_stats = dict()
+        self.remote_directories = set()
+        for session_id in range(self.config_object.ftp_sessions):
+            ftp_uploader_object = workers.FtpUploader(
+                session_id,
+                self.config_object.hostname,
+                self.config_object.port,
+                self.config_object.username,
+                self.config_object.password,
+                self.config_object.remote_dir,
+                self.config_object.local_website_dir,
+                self.config_object.edits_engine,
+                False,
+                self.sent_hashes,
+                self.sent_stats,
+                self.remote_directories,
+                self.config_object.compiled_normalisation_rules,
+                self.config_object.remote_hash_check,
+                self.edit_cache,
+            )
+            self.signal_ftp_connect.connect(ftp_uploader_object.initiate_ftp_connection)
+            self.signal_ftp_reconnect.connect(ftp_uploader_object.reconnect)
+            ftp_uploader_object.connection_successful_signal.connect(
+                self.enable_stop_uploader
+            )
+            ftp_uploader_object.give_up_signal.connect(self.receive_session_failure)
+            ftp_uploader_object.upload_successful.connect(
+                self.remove_upload_queue_entry
+            )
+            ftp_uploader_object.upload_unchanged.connect(
+                self.remove_unchanged_queue_entry
+            )
+            ftp_uploader_object.upload_failed.connect(self.requeue_failed_upload)
+            self.signal_ftp_keepalive.connect(ftp_uploader_object.send_keepalive_signal)
+            ftp_uploader_object.keepalive_successful.connect(
+                self.receive_successful_keepalive
+            )
+            self.signal_upload_file.connect(ftp_uploader_object.receive_upload_signal)
+            self.signal_delete_files.connect(ftp_uploader_object.delete_files)
+            ftp_uploader_object.deletion_successful.connect(
+                self.remove_deleted_queue_entries
+            )
+            self.signal_remote_snapshot.connect(
+                ftp_uploader_object.take_remote_snapshot
+            )
+            ftp_uploader_object.remote_snapshot_signal.connect(
+                self.receive_remote_snapshot
+            )
+
+            ftp_uploader_thread = QThread()
+            ftp_uploader_thread.finished.connect(ftp_uploader_object.stop)
+            ftp_uploader_object.moveToThread(ftp_uploader_thread)
+            ftp_uploader_thread.start()
 
-        self.ftp_uploader_thread = QThread()
-        self.ftp_uploader_thread.finished.connect(self.ftp_uploader_object.stop)
-        self.ftp_uploader_object.moveToThread(self.ftp_uploader_thread)
-        self.ftp_uploader_thread.start()
+            self.ftp_uploader_objects.append(ftp_uploader_object)
+            self.ftp_uploader_threads.append(ftp_uploader_thread)
+            self.ftp_sessions.append(FtpSession(session_id))
         self.signal_ftp_connect.emit()
 
         self.upload_timer = QTimer(self)
+        self.upload_timer.setSingleShot(True)
         self.upload_timer.timeout.connect(self.dispatch_upload_signals)
-        self.upload_timer.start(self.upload_frequency)
 
     def stop_ftp_uploader(self):
-        if self.ftp_uploader_thread:
+        if self.ftp_uploader_threads:
             self.upload_timer.stop()
-            self.ftp_uploader_thread.quit()
-            self.ftp_uploader_thread.wait()
-
-            self.ftp_uploader_thread.deleteLater()
-            self.ftp_uploader_object.deleteLater()
+            for ftp_uploader_thread in self.ftp_uploader_threads:
+                ftp_uploader_thread.quit()
+            for ftp_uploader_thread in self.ftp_uploader_threads:
+                ftp_uploader_thread.wait()
+                ftp_uploader_thread.deleteLater()
+            for ftp_uploader_object in self.ftp_uploader_objects:
+                ftp_uploader_object.deleteLater()
             self.upload_timer.deleteLater()
 
-            self.upload_timer = None
-            self.ftp_uploader_object = None
-            self.ftp_uploader_thread = None
+            for session in self.ftp_sessions:
+                self.logger.info(f"{session}")
 
-    @Slot(str, QDateTime, str)
-    def receive_upload_signal(
-        self, filepath: str, signal_time: QDateTime, operation: str
-    ):
-        if self.accepting_signals is True:
-            self.append_filesystem_signal(
-                self.upload_queue, filepath, signal_time, operation
+            self.upload_timer = None
+            self.ftp_uploader_objects = []
+            self.ftp_uploader_threads = []
+            self.ftp_sessions = []
+
+    @Slot(list)
+    def receive_upload_events(self, events: list[tuple[str, int, str]]):
+        """
+        Queue a batch of (path, time in ms since epoch, operation) events for upload, dispatching once after.
+
+        Deleted files are queued for deletion from the remote, sharing the entry of any upload queued for them.
+        Where remote deletion is off, they are forgotten straight away instead.
+        """
+        if self.accepting_signals is not True:
+            return
+        forgotten_files = []
+        for filepath, event_time, operation in events:
+            if self.is_website_copy_of_pdf(filepath):
+                continue
+            self.upload_write_tracker.record_event(filepath, event_time, operation)
+            if operation == "delete" and self.config_object.remote_deletion is False:
+                self.remove_deleted_entry(self.upload_queue, filepath)
+                forgotten_files.append(filepath)
+                continue
+            if operation != "delete" and operation not in self.queued_operations:
+                continue
+            queue_entry = self.upload_queue.add_entry(filepath, event_time, operation)
+            if queue_entry.in_progress is False:
+                self.schedule_upload(queue_entry)
+        if len(forgotten_files) > 0:
+            self.signal_record_deletions.emit(forgotten_files)
+        self.dispatch_upload_signals()
+
+    def is_website_copy_of_pdf(self, filepath: str) -> bool:
+        """
+        Check for target PDFs in the website folder, which are not uploaded when their sources are uploaded directly.
+        """
+        return (
+            self.config_object.copy_pdfs is True
+            and self.config_object.pdf_upload_mode != "copy"
+            and editor.is_website_copy_of_pdf(
+                filepath, self.config_object.local_website_dir, self.target_pdfs
             )
+        )
 
-    @Slot()
-    def receive_successful_keepalive(self):
+    @Slot(int)
+    def receive_successful_keepalive(self, session_id: int):
+        session = self.get_session(session_id)
+        if session is None:
+            return
         self.time_last_update = QDateTime.currentSecsSinceEpoch()
+        session.last_activity = self.time_last_update
         self.display_time_since_last_update()
-        self.labelConnectionStatusDisplay.setText("Connected")
+        self.update_connection_status()
+
+    @Slot(int, str)
+    def receive_session_failure(self, session_id: int, error_message: str):
+        """
+        Return a failed session's files to the queue for the remaining sessions, and reconnect it after a delay.
+
+        Sessions that never connected, or are out of reconnection attempts, are taken out of the pool for good.
+        """
+        session = self.get_session(session_id)
+        if session is None:
+            return
+        for filepath in [session.current_file] + session.current_deletions:
+            queue_entry = self.upload_queue.event_queue.get(filepath)
+            if queue_entry is not None:
+                queue_entry.set_stalled()
+                self.schedule_upload(queue_entry)
+        self.logger.error(f"Session {session_id + 1} failed: {error_message}")
+        if (
+            session.last_activity is not None
+            and session.reconnect_attempts < self.max_reconnects
+        ):
+            session.set_reconnecting()
+            delay = session.reconnect_attempts * self.reconnect_delay
+            self.logger.info(
+                f"Reconnecting session {session_id + 1} in {delay / 1000:.0f} s."
+            )
+            QTimer.singleShot(delay, self, lambda: self.reconnect_session(session))
+        else:
+            session.set_failed()
+
+        if not any(session.is_alive() for session in self.ftp_sessions):
+            self.emergency_stop_uploader(error_message)
+        else:
+            self.update_connection_status()
+            self.dispatch_upload_signals()
+
+    def reconnect_session(self, session: FtpSession):
+        # The pool may have been stopped, or stopped and started again, while waiting.
+        if self.get_session(session.session_id) is session:
+            self.signal_ftp_reconnect.emit(session.session_id)
+
+    def get_session(self, session_id: int) -> FtpSession | None:
+        """
+        Look up a session of the running pool, ignoring signals that arrive after the pool is stopped.
+        """
+        if session_id < len(self.ftp_sessions):
+            return self.ftp_sessions[session_id]
+        return None
+
+    def get_idle_session(self) -> FtpSession | None:
+        for session in self.ftp_sessions:
+            if session.is_idle():
+                return session
+        return None
+
+    def get_upload_ready_time(self, queue_entry: QueueEntry) -> tuple[int | None, bool]:
+        """
+        Work out when an upload queue entry is due, and whether it is waiting for its segment to start.
+
+        Deletions are due once they have waited in case the file is written again. Other files are due once they
+        appear completely written. Judging panel pages are due once the check time is the cool-off period past the
+        start of their segment. A custom upload time does not advance, so under one these pages are either due now
+        or not due until the time or the panel schedule changes.
+        """
+        if queue_entry.action == "delete":
+            return (queue_entry.time_added + self.deletion_delay, False)
+        if queue_entry.check_time is False:
+            return (
+                self.upload_write_tracker.get_ready_time(
+                    queue_entry.full_path, queue_entry.time_added
+                ),
+                False,
+            )
+        time_now = QDateTime.currentMSecsSinceEpoch()
+        start_time = self.panel_dict.get(queue_entry.basename)
+        if start_time is None:
+            start_time_ms = time_now
+        else:
+            start_time_ms = start_time.toMSecsSinceEpoch()
+        if self.custom_upload_time is None:
+            if start_time is None:
+                return (None, False)
+            return (start_time_ms + self.cool_off_period, start_time_ms > time_now)
+        check_time = self.custom_upload_time.toMSecsSinceEpoch()
+        if check_time - start_time_ms >= self.cool_off_period:
+            return (time_now, False)
+        return (None, check_time < start_time_ms)
+
+    def schedule_upload(self, queue_entry: QueueEntry):
+        ready_at, future = self.get_upload_ready_time(queue_entry)
+        if ready_at is not None and queue_entry.attempts > 0:
+            ready_at += min(
+                queue_entry.attempts * self.retry_backoff, self.max_retry_backoff
+            )
+        if future is True and queue_entry.future is False:
+            queue_entry.set_future()
+        elif future is False and queue_entry.future is True:
+            queue_entry.unset_future()
+        self.upload_queue.set_ready_time(queue_entry, ready_at)
+
+    def reschedule_upload_queue(self):
+        """
+        Reschedule the judging panel pages waiting to upload, after the check time or the panel schedule changes.
+        """
+        if self.panel_dict is None:
+            return
+        for queue_entry in self.upload_queue.event_queue.values():
+            if queue_entry.check_time is True and queue_entry.in_progress is False:
+                self.schedule_upload(queue_entry)
+        self.dispatch_upload_signals()
 
     @Slot()
     def dispatch_upload_signals(self):
-        for value in self.upload_queue.event_queue.values():
-            if value.check_time is True:
-                item_upload_time = self.panel_dict.get(
-                    value.basename, QDateTime.currentDateTime()
-                ).toMSecsSinceEpoch()
-                check_time = self.get_check_time().toMSecsSinceEpoch()
+        """
+        Hand the entries now due to idle sessions, then wait for the next entry to become due.
+
+        While every session is busy, the timer is left stopped and sessions dispatch again as they finish.
+        """
+        if self.upload_timer is None:
+            return
+        time_now = QDateTime.currentMSecsSinceEpoch()
+        while (session := self.get_idle_session()) is not None:
+            value = self.upload_queue.pop_ready(time_now)
+            if value is None:
+                break
+            if value.action == "delete":
+                self.dispatch_deletions(session, value, time_now)
+                continue
+            try:
+                wait = self.upload_write_tracker.probe(value.full_path, time_now)
+            except FileNotFoundError:
+                self.logger.info(
+                    f"Dropped {value.basename} from the queue, as it was deleted."
+                )
+                self.upload_queue.remove_entry(value.full_path)
+                continue
+            if wait is not None:
+                self.upload_queue.set_ready_time(value, time_now + wait)
+                continue
+            session.set_busy(value.full_path, QDateTime.currentMSecsSinceEpoch())
+            if self.first_upload_dispatched is False:
+                self.first_upload_dispatched = True
+                self.logger.info(
+                    f"First upload dispatched {time.perf_counter() - self.startup_started:.2f} s after starting."
+                )
+            value.set_in_progress(session.session_id)
+            if value.future is True:
+                value.unset_future()
+            self.signal_upload_file.emit(value.full_path, session.session_id)
+        if session is None:
+            self.upload_timer.stop()
+        else:
+            self.arm_queue_timer(self.upload_timer, self.upload_queue)
+
+    def dispatch_deletions(
+        self, session: FtpSession, queue_entry: QueueEntry, time_now: int
+    ):
+        """
+        Hand a due deletion to a session, batched with the deletions due next, up to the batch window after it.
+
+        A file found to exist again is uploaded instead, so a remote copy is never deleted while the file is there.
+        """
+        batch = []
+        while queue_entry is not None:
+            if os.path.exists(queue_entry.full_path):
+                self.upload_queue.add_entry(queue_entry.full_path, time_now, "create")
+                self.schedule_upload(queue_entry)
             else:
-                check_time = QDateTime.currentMSecsSinceEpoch()
-                item_upload_time = value.time_added
-            if value.in_progress is False:
-                if (check_time - item_upload_time) >= self.cool_off_period:
-                    value.set_in_progress()
-                    value.unset_future()
-                    value.standard_item.setText(f"📨{value.basename}")
-                    self.signal_upload_file.emit(value.full_path, 0)
-                elif (check_time - item_upload_time) < 0 and value.future is False:
-                    value.standard_item.setText(f"⏳{value.basename}")
-                    value.set_future()
+                queue_entry.set_in_progress(session.session_id)
+                if queue_entry.future is True:
+                    queue_entry.unset_future()
+                batch.append(queue_entry.full_path)
+            next_entry = self.upload_queue.peek_scheduled()
+            if (
+                len(batch) >= self.deletion_batch_size
+                or next_entry is None
+                or next_entry.action != "delete"
+            ):
+                break
+            queue_entry = self.upload_queue.pop_ready(
+                time_now + self.deletion_batch_window
+            )
+        if len(batch) > 0:
+            session.set_deleting(batch, QDateTime.currentMSecsSinceEpoch())
+            self.signal_delete_files.emit(batch, session.session_id)
+
+    def finish_upload_queue_entry(self, filepath: str, session: FtpSession | None):
+        """
+        Remove an uploaded entry from the queue, unless the file changed while it was uploading, in which case it
+        is scheduled to go again once it is completely written.
+        """
+        queue_entry = self.upload_queue.event_queue.get(filepath)
+        if (
+            queue_entry is not None
+            and session is not None
+            and queue_entry.time_added >= session.busy_since
+        ):
+            # The attempt completed, so the file is not held back as a retry.
+            queue_entry.attempts = 0
+            queue_entry.set_stalled()
+            self.schedule_upload(queue_entry)
+        else:
+            self.upload_queue.remove_entry(filepath)
 
-    @Slot(str)
-    def remove_upload_queue_entry(self, filepath: str):
-        self.upload_queue.remove_entry(filepath)
+    @Slot(str, int)
+    def remove_upload_queue_entry(self, filepath: str, session_id: int):
         self.time_last_update = QDateTime.currentSecsSinceEpoch()
+        session = self.get_session(session_id)
+        self.finish_upload_queue_entry(filepath, session)
+        if session is not None:
+            self.signal_record_upload.emit(
+                filepath, QDateTime.fromMSecsSinceEpoch(session.busy_since)
+            )
+            session.uploads_completed += 1
+            session.set_idle(self.time_last_update)
         self.display_time_since_last_update()
+        self.update_connection_status()
+        self.dispatch_upload_signals()
+
+    @Slot(list, int)
+    def remove_deleted_queue_entries(self, filepaths: list[str], session_id: int):
+        """
+        Remove deletions from the queue once sent, and forget the deleted files in the save state.
+
+        Files created again while their remote copies were being deleted stay queued, to be uploaded.
+        """
+        self.time_last_update = QDateTime.currentSecsSinceEpoch()
+        session = self.get_session(session_id)
+        for filepath in filepaths:
+            self.finish_upload_queue_entry(filepath, session)
+        self.signal_record_deletions.emit(filepaths)
+        if session is not None:
+            session.deletions_completed += len(filepaths)
+            session.set_idle(self.time_last_update)
+        self.display_time_since_last_update()
+        self.update_connection_status()
+        self.dispatch_upload_signals()
+
+    @Slot(str, int)
+    def remove_unchanged_queue_entry(self, filepath: str, session_id: int):
+        session = self.get_session(session_id)
+        self.finish_upload_queue_entry(filepath, session)
+        if session is not None:
+            self.signal_record_upload.emit(
+                filepath, QDateTime.fromMSecsSinceEpoch(session.busy_since)
+            )
+            session.uploads_unchanged += 1
+            session.set_idle(session.last_activity)
+        self.update_connection_status()
+        self.dispatch_upload_signals()
+
+    @Slot(str, int)
+    def requeue_failed_upload(self, filepath: str, session_id: int):
+        """
+        Return a file that could not be read or edited to the queue, to try again after the retry backoff.
+
+        A file deleted since is dropped from the queue when next due, unless it is due for deletion instead.
+        """
+        session = self.get_session(session_id)
+        queue_entry = self.upload_queue.event_queue.get(filepath)
+        if queue_entry is not None:
+            queue_entry.set_stalled()
+            self.schedule_upload(queue_entry)
+        if session is not None:
+            session.set_idle(session.last_activity)
+        self.update_connection_status()
+        self.dispatch_upload_signals()
 
     def test_filepaths(self):
         filepaths_to_test = {self.config_object.local_website_dir: "folder"}
@@ -665,12 +1135,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.pushButtonRun.setText("Initialising...")
             self.collect_configuration()
             self.test_filepaths()
+            self.edit_cache = self.config_object.create_edit_cache()
 
             self.upload_queue.clear()
             self.copy_queue.clear()
-
+            self.upload_write_tracker.clear()
+            self.copy_write_tracker.clear()
+
+            self.startup_snapshot = None
+            self.startup_scan_requested = False
+            self.startup_started = time.perf_counter()
+            self.startup_timings = dict()
+            self.first_upload_dispatched = False
             self.start_differencer()
             self.signal_create_panel_dict.emit()
+            self.pushButtonRun.setText("Connecting...")
+            self.start_ftp_uploader()
 
             self.set_action_state(False)
             self.set_config_ui_state(False)
@@ -694,22 +1174,116 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 e, "Error encountered when collecting configuration"
             )
 
+    def restore_upload_queue(self):
+        """
+        Journal the upload queue next to the save file, restoring the uploads left queued by the last run.
+        """
+        if self.config_object.save_filepath is None:
+            return
+        try:
+            restored_entries = self.upload_queue.open_journal(
+                f"{self.config_object.save_filepath}.queue"
+            )
+        except OSError as e:
+            self.logger.warning(f"Could not open upload queue journal: {e}")
+            return
+        for queue_entry in restored_entries:
+            if self.is_website_copy_of_pdf(queue_entry.full_path) or (
+                queue_entry.action == "delete"
+                and self.config_object.remote_deletion is False
+            ):
+                self.upload_queue.remove_entry(queue_entry.full_path)
+            else:
+                self.schedule_upload(queue_entry)
+        if len(restored_entries) > 0:
+            self.logger.info(
+                f"Restored {len(restored_entries)} queued uploads from the last run."
+            )
+
     def run_uploader_phase_two(self):
+        self.restore_upload_queue()
         self.start_ftp_filesystem_watcher()
-        self.pushButtonRun.setText("Connecting...")
-        self.start_ftp_uploader()
 
         if self.config_object.copy_pdfs is True:
-            self.start_pdf_copier()
+            if self.config_object.pdf_upload_mode != "direct":
+                self.start_pdf_copier()
             self.start_pdf_filesystem_watcher()
 
-    @Slot(str)
-    def enable_stop_uploader(self, message: str):
-        self.textBrowserServerMessages.setText(message)
-        self.labelConnectionStatusDisplay.setText("Connected")
-        self.signal_initial_folder_read.emit()
-        self.pushButtonRun.setText("Stop")
-        self.pushButtonRun.setEnabled(True)
+        # Scanned after the watchers start, so no change is missed between the scan and the first event.
+        self.signal_scan_folders.emit()
+        self.startup_scan_requested = True
+        self.join_startup_stages()
+
+    def join_startup_stages(self):
+        """
+        Start the initial checks once the folders are being scanned and the remote snapshot has arrived.
+        """
+        if self.startup_snapshot is None or self.startup_scan_requested is False:
+            return
+        remote_snapshot = self.startup_snapshot
+        self.startup_snapshot = None
+        self.startup_scan_requested = False
+        self.signal_initial_folder_read.emit(remote_snapshot)
+
+    @Slot(str, float)
+    def record_startup_stage(self, stage: str, seconds: float):
+        """
+        Record how long a startup stage took, showing them all once the initial checks are done.
+
+        Stopping is only allowed from then on, as stopping writes the save file from the folder as it is, which
+        before the initial checks would record the changed files not yet queued as uploaded.
+        """
+        if self.accepting_signals is not True or self.startup_started is None:
+            return
+        self.startup_timings[stage] = seconds
+        self.logger.info(f"Startup stage {stage} took {seconds:.3f} s.")
+        if stage == "initial checks":
+            total = time.perf_counter() - self.startup_started
+            stages = ", ".join(
+                f"{name} {duration:.2f} s"
+                for name, duration in self.startup_timings.items()
+            )
+            self.textBrowserServerMessages.append(
+                f"Startup took {total:.2f} s ({stages})."
+            )
+            self.logger.info(f"Startup took {total:.2f} s ({stages}).")
+            self.pushButtonRun.setText("Stop")
+            self.pushButtonRun.setEnabled(True)
+
+    @Slot(int, str)
+    def enable_stop_uploader(self, session_id: int, message: str):
+        session = self.get_session(session_id)
+        if session is None:
+            return
+        session.set_idle(QDateTime.currentSecsSinceEpoch())
+        self.update_connection_status()
+        self.dispatch_upload_signals()
+        if self.initial_read_requested is False:
+            self.initial_read_requested = True
+            self.textBrowserServerMessages.setText(message)
+            self.record_startup_stage(
+                "connection", time.perf_counter() - self.startup_started
+            )
+            if self.config_object.remote_snapshot is True:
+                self.snapshot_requested = time.perf_counter()
+                self.signal_remote_snapshot.emit(session_id)
+            else:
+                self.startup_snapshot = dict()
+                self.join_startup_stages()
+            self.pushButtonRun.setText("Checking...")
+
+    @Slot(dict)
+    def receive_remote_matches(self, matched_hashes: dict[str, str]):
+        self.sent_hashes.update(matched_hashes)
+
+    @Slot(dict)
+    def receive_remote_snapshot(self, remote_snapshot: dict):
+        if self.accepting_signals is True:
+            self.record_startup_stage(
+                "remote snapshot", time.perf_counter() - self.snapshot_requested
+            )
+            self.startup_snapshot = remote_snapshot
+            self.join_startup_stages()
 
     @Slot(str)
     def emergency_stop_uploader(self, error_message: str):
@@ -787,6 +1361,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.set_action_state(True)
         self.set_config_ui_state(True)
         self.labelConnectionStatusDisplay.setText("Disconnected")
+        self.labelConnectionStatusDisplay.setToolTip("")
         self.textBrowserServerMessages.clear()
         self.stop_differencer()
         self.graceful_stop = False
@@ -817,6 +1392,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.checkBoxCopyPDFs.setChecked(self.config_object.copy_pdfs)
 
     def collect_configuration(self):
+        previous_config = self.config_object
         self.config_object = Configuration()
         self.config_object.from_vars(
             self.lineEditHostname.text(),
@@ -830,6 +1406,19 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.lineEditEditsFile.text().replace('"', ""),
             self.lineEditSaveFile.text().replace('"', ""),
             self.checkBoxCopyPDFs.isChecked(),
+            ftp_sessions=previous_config.ftp_sessions,
+            remote_snapshot=previous_config.remote_snapshot,
+            remote_hash_check=previous_config.remote_hash_check,
+            normalisation_rules=previous_config.normalisation_rules,
+            edits_mode=previous_config.edits_mode,
+            edit_cache_mb=previous_config.edit_cache_mb,
+            edit_cache_policy=previous_config.edit_cache_policy,
+            edit_cache_folder=previous_config.edit_cache_folder,
+            edit_cache_disk_mb=previous_config.edit_cache_disk_mb,
+            hash_algorithm=previous_config.hash_algorithm,
+            pdf_upload_mode=previous_config.pdf_upload_mode,
+            watcher_mode=previous_config.watcher_mode,
+            remote_deletion=previous_config.remote_deletion,
         )
 
     def open_file_chooser(
@@ -3,35 +3,201 @@
 
 from PySide6.QtCore import Slot, Signal, QObject, QDateTime
 
-from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.events import (
+    FileClosedEvent,
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileModifiedEvent,
+    FileMovedEvent,
+    FileSystemEvent,
+    FileSystemEventHandler,
+)
 from watchdog.observers import Observer
 
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
 import io
 import shutil
 import os
 import logging
 import json
+import hashlib
+import ftplib
+import re
+import threading
+import time
 
 import ftp
 import editor
 
 LOGGER = logging.getLogger(__name__)
-EDITABLE_TEXT_EXTENSIONS = ("htm", "html", "txt")
+EDITABLE_TEXT_EXTENSIONS = editor.EDITABLE_TEXT_EXTENSIONS
 RETRIES = 3
+UPLOAD_BLOCK_SIZE = ftp.UPLOAD_BLOCK_SIZE
+REMOTE_TIME_MARGIN_SECS = 2
 MEMORY_LIMIT_BYTES = 500_000_000
+JOURNAL_COMPACT_RECORDS = 500
 
 
-def replace_strings(html_string: str, replacements: dict[str, str]) -> str:
-    for original, replacement in replacements.items():
-        html_string = html_string.replace(original, replacement)
-    return html_string
+class HashingReader(io.RawIOBase):
+    """
+    Raw reader passing the bytes read from a binary file to a running hash.
+    """
+
+    def __init__(self, file_object, file_hash):
+        self.file_object = file_object
+        self.file_hash = file_hash
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n_bytes = self.file_object.readinto(buffer)
+        self.file_hash.update(memoryview(buffer)[:n_bytes])
+        return n_bytes
+
+
+def stream_edited_text(
+    filepath: str,
+    edits_engine: editor.ReplacementEngine,
+    block_size: int,
+    source_hash=None,
+) -> Iterator[bytes]:
+    """
+    Read a text file in blocks, yielding the edited text encoded as UTF-8.
+
+    If `source_hash` is given, the raw bytes of the file are added to it as they are read.
+    """
+    with open(filepath, "rb") as raw_file:
+        if source_hash is None:
+            f = io.TextIOWrapper(raw_file)
+        else:
+            f = io.TextIOWrapper(
+                io.BufferedReader(HashingReader(raw_file, source_hash))
+            )
+        chunks = iter(lambda: f.read(block_size), "")
+        for chunk in edits_engine.stream(chunks, block_size):
+            if chunk:
+                yield chunk.encode("utf-8")
+
+
+def read_upload_chunks(
+    filepath: str, edits_engine: editor.ReplacementEngine
+) -> Iterator[bytes]:
+    """
+    Yield the bytes an upload of the file sends, with the edits applied to text files.
+    """
+    if filepath.endswith(EDITABLE_TEXT_EXTENSIONS):
+        yield from stream_edited_text(filepath, edits_engine, UPLOAD_BLOCK_SIZE)
+    else:
+        with open(filepath, "rb") as f:
+            while chunk := f.read(UPLOAD_BLOCK_SIZE):
+                yield chunk
+
+
+def read_edited_chunks(
+    filepath: str,
+    edits_engine: editor.ReplacementEngine,
+    edit_cache: editor.EditCache | None,
+) -> Iterator[bytes]:
+    """
+    Yield the bytes an upload of the file sends, serving edited text files from the cache where possible.
+
+    Text files missing from the cache are edited as they are streamed and added to it afterwards, under the
+    checksum of the bytes actually read.
+    """
+    if (
+        edit_cache is None
+        or edit_cache.max_entry_bytes == 0
+        or not filepath.endswith(EDITABLE_TEXT_EXTENSIONS)
+    ):
+        yield from read_upload_chunks(filepath, edits_engine)
+        return
+
+    content = edit_cache.get(editor.hash_sha256(filepath), edits_engine.digest)
+    if content is not None:
+        for position in range(0, len(content), UPLOAD_BLOCK_SIZE):
+            yield content[position : position + UPLOAD_BLOCK_SIZE]
+        return
+
+    source_hash = hashlib.sha256()
+    edited_chunks = []
+    size = 0
+    for chunk in stream_edited_text(
+        filepath, edits_engine, UPLOAD_BLOCK_SIZE, source_hash
+    ):
+        size += len(chunk)
+        if size <= edit_cache.max_entry_bytes:
+            edited_chunks.append(chunk)
+        yield chunk
+    if size <= edit_cache.max_entry_bytes:
+        edit_cache.put(
+            source_hash.hexdigest(), edits_engine.digest, b"".join(edited_chunks)
+        )
+
+
+def hash_chunks(chunks: Iterable[bytes], *file_hashes) -> Iterator[bytes]:
+    """
+    Pass chunks through unchanged, adding each to one or more running hashes.
+    """
+    for chunk in chunks:
+        for file_hash in file_hashes:
+            file_hash.update(chunk)
+        yield chunk
+
+
+def remote_copy_matches(
+    filepath: str,
+    remote_file: ftp.RemoteFile,
+    edits_engine: editor.ReplacementEngine,
+    normalisation_rules: list[re.Pattern] | None = None,
+    edit_cache: editor.EditCache | None = None,
+) -> str | None:
+    """
+    Check whether a remote file already holds what uploading the local file would send.
+
+    Text files are compared on their edited bytes. The sizes must agree, and then either the remote SHA-256
+    matches or the remote copy was written after the local file was last modified. Returns the (normalised)
+    checksum of the bytes an upload would send if the remote copy matches, otherwise `None`.
+    """
+    if remote_file.size is None:
+        return None
+    if not filepath.endswith(EDITABLE_TEXT_EXTENSIONS):
+        if os.path.getsize(filepath) != remote_file.size:
+            return None
+
+    size = 0
+    file_hash = hashlib.sha256()
+    content_digest = editor.ContentDigest(
+        editor.get_normalisation_rules(filepath, normalisation_rules)
+    )
+    for chunk in hash_chunks(
+        read_edited_chunks(filepath, edits_engine, edit_cache),
+        file_hash,
+        content_digest,
+    ):
+        size += len(chunk)
+    if size != remote_file.size:
+        return None
+
+    if remote_file.sha256 is not None:
+        matches = file_hash.hexdigest() == remote_file.sha256
+    elif remote_file.modify is not None:
+        local_modify = os.path.getmtime(filepath)
+        matches = remote_file.modify >= local_modify + REMOTE_TIME_MARGIN_SECS
+    else:
+        matches = False
+    return content_digest.hexdigest() if matches else None
 
 
 class Differencer(QObject):
-    pdf_to_copy = Signal(str, QDateTime, str)
-    file_to_upload = Signal(str, QDateTime, str)
+    pdfs_to_copy = Signal(list)
+    files_to_upload = Signal(list)
+    remote_matches = Signal(dict)
     send_panel_dictionary = Signal(dict)
+    panel_dictionary_updated = Signal(dict)
     save_written = Signal()
+    stage_completed = Signal(str, float)
     fail_signal = Signal(str)
 
     def __init__(
@@ -39,112 +205,548 @@ class Differencer(QObject):
         local_website_folder: str,
         save_filepath: str | None,
         pdf_root_folder: str | None,
+        edits_engine: editor.ReplacementEngine,
+        normalisation_rules: list[re.Pattern],
+        edit_cache: editor.EditCache | None = None,
+        hash_algorithm: str = "sha256",
+        pdf_upload_mode: str = "copy",
     ):
         super().__init__()
         self.panel_dict = None
+        self.panel_hash = None
+        # Files found changed by `scan_folders`, waiting for the remote snapshot before the initial checks.
+        self.scanned_files = None
+        self.edits_engine = edits_engine
+        self.edit_cache = edit_cache
+        self.normalisation_rules = normalisation_rules
+        # Checksums are compared using the algorithm of the save file, and written with the configured one.
+        self.hash_algorithm = hash_algorithm
+        self.save_algorithm = hash_algorithm
         self.local_website_folder = local_website_folder
         self.save_filepath = save_filepath
+        # Filepath -> (size, modification time, inode) and the checksum computed for them, so unchanged files
+        # are not read again when the folder is checked at startup and when the save file is written.
+        self.stat_cache = dict()
+        self.journal = None
         if self.save_filepath is not None:
+            self.journal = editor.SaveJournal(f"{self.save_filepath}.journal")
             if os.path.exists(self.save_filepath):
                 with open(self.save_filepath, "r") as f:
-                    self.save_state = json.load(f)
+                    self.save_state, self.stat_cache, self.save_algorithm = (
+                        editor.read_save_state(json.load(f), self.normalisation_rules)
+                    )
+                self.replay_journal()
             else:
+                self.journal.clear()
                 with open(self.save_filepath, "w") as f:
                     self.save_state = dict()
                     json.dump(self.save_state, f)
         else:
             self.save_state = dict()
         self.pdf_root_folder = pdf_root_folder
+        self.pdf_upload_mode = pdf_upload_mode
+        if self.pdf_root_folder is not None:
+            self.pdf_index = editor.PdfIndex(self.pdf_root_folder)
+        else:
+            self.pdf_index = None
+
+    def replay_journal(self):
+        """
+        Apply the uploads and deletions journalled since the save file was written, such as before a crash.
+        """
+        rules_digest = editor.get_rules_digest(self.normalisation_rules)
+        records = self.journal.read()
+        for record in records:
+            if record.get("deleted") is True:
+                self.save_state.pop(record["path"], None)
+                self.stat_cache.pop(record["path"], None)
+                continue
+            if record["algorithm"] != self.save_algorithm:
+                continue
+            self.save_state[record["path"]] = record["hash"]
+            if record["rules"] == rules_digest and record["stat"] is not None:
+                self.stat_cache[record["path"]] = (
+                    tuple(record["stat"]),
+                    record["hash"],
+                )
+            else:
+                self.stat_cache.pop(record["path"], None)
+        if len(records) > 0:
+            LOGGER.info(
+                f"Recovered {len(records)} uploads and deletions from the save journal."
+            )
+
+    @Slot(str, QDateTime)
+    def record_upload(self, filepath: str, upload_started: QDateTime):
+        """
+        Journal a file as uploaded, so it is not uploaded again after a crash or emergency stop.
+
+        Files modified since the upload started may not have been sent as they are now, so are left for the
+        next upload. The save file is rewritten every `JOURNAL_COMPACT_RECORDS` records. Without a save file, the
+        upload is only recorded in memory, for the rescans after event storms.
+        """
+        try:
+            stat_key = editor.get_stat_key(os.stat(filepath))
+        except OSError:
+            return
+        if stat_key[1] >= upload_started.toMSecsSinceEpoch() * 1_000_000:
+            return
+        cached_entry = self.stat_cache.get(filepath)
+        if cached_entry is not None and cached_entry[0] == stat_key:
+            file_hash = cached_entry[1]
+        else:
+            file_hash = editor.hash_file(
+                filepath, self.normalisation_rules, self.save_algorithm
+            )
+            if file_hash is None:
+                return
+        cache_stat = time.time_ns() - stat_key[1] > editor.STAT_RACE_MARGIN_NS
+
+        self.save_state[filepath] = file_hash
+        if cache_stat:
+            self.stat_cache[filepath] = (stat_key, file_hash)
+        else:
+            self.stat_cache.pop(filepath, None)
+        if self.journal is None:
+            return
+        try:
+            self.journal.append(
+                {
+                    "path": filepath,
+                    "hash": file_hash,
+                    "stat": list(stat_key) if cache_stat else None,
+                    "algorithm": self.save_algorithm,
+                    "rules": editor.get_rules_digest(self.normalisation_rules),
+                }
+            )
+            if self.journal.records >= JOURNAL_COMPACT_RECORDS:
+                self.compact_journal()
+        except OSError as e:
+            LOGGER.warning(f"Could not journal upload of {filepath}: {e}")
+
+    @Slot(list)
+    def record_deletions(self, filepaths: list[str]):
+        """
+        Forget files once their remote copies are deleted, or once deleted locally where remote deletion is off,
+        journalling them so they stay forgotten after a crash.
+        """
+        forgotten_files = []
+        for filepath in filepaths:
+            self.stat_cache.pop(filepath, None)
+            if self.save_state.pop(filepath, None) is not None:
+                forgotten_files.append(filepath)
+        if self.journal is None:
+            return
+        try:
+            for filepath in forgotten_files:
+                self.journal.append({"path": filepath, "deleted": True})
+            if self.journal.records >= JOURNAL_COMPACT_RECORDS:
+                self.compact_journal()
+        except OSError as e:
+            LOGGER.warning(f"Could not journal deletions: {e}")
+
+    def compact_journal(self):
+        """
+        Fold the journal into the save file and start a new one.
+        """
+        editor.write_json_atomically(
+            self.save_filepath,
+            editor.write_save_state(
+                self.save_state,
+                self.stat_cache,
+                self.normalisation_rules,
+                self.save_algorithm,
+            ),
+        )
+        self.journal.clear()
 
     @Slot()
     def create_panel_dict(self):
         if os.path.exists(os.path.join(self.local_website_folder, "index.htm")):
+            stage_start = time.perf_counter()
             try:
+                self.panel_hash = editor.hash_file(
+                    os.path.join(self.local_website_folder, "index.htm")
+                )
                 with open(
-                    os.path.join(self.local_website_folder, "index.htm"), "r"
+                    os.path.join(self.local_website_folder, "index.htm"), "rb"
                 ) as f:
                     html = f.read()
                 self.panel_dict = editor.create_panel_dict(html)
-                self.send_panel_dictionary.emit(self.panel_dict)
-            except Exception:
+            except Exception as e:
+                LOGGER.error(
+                    f"Could not read panel schedule, so no panel pages will upload without a custom time: {e}"
+                )
                 self.panel_dict = dict()
-                self.send_panel_dictionary.emit(self.panel_dict)
+            self.stage_completed.emit(
+                "panel schedule", time.perf_counter() - stage_start
+            )
+            self.send_panel_dictionary.emit(self.panel_dict)
         else:
             self.fail_signal.emit(
                 "index.htm not found! Index page must be present before running uploader."
             )
 
+    def uploads_pdfs_directly(self) -> bool:
+        return self.pdf_index is not None and self.pdf_upload_mode != "copy"
+
+    def hash_indexed_pdfs(self) -> dict[str, str]:
+        return editor.hash_paths(
+            [entry.path for entry in self.pdf_index.entries.values()],
+            self.normalisation_rules,
+            self.stat_cache,
+            self.save_algorithm,
+        )
+
+    @Slot(list)
+    def update_panel_dict(self, events: list[tuple[str, int, str]]):
+        """
+        Parse the panel schedule again when a batch of watcher events includes index.htm, sending it on if it has
+        changed.
+
+        The page is only parsed if its checksum differs from the last one parsed. If it can't be parsed, the
+        previous schedule is kept.
+        """
+        if self.panel_dict is None:
+            return
+        filepath = os.path.join(self.local_website_folder, "index.htm")
+        if not any(
+            path == filepath and operation != "delete" for path, _, operation in events
+        ):
+            return
+        panel_hash = editor.hash_file(filepath)
+        if panel_hash is None or panel_hash == self.panel_hash:
+            return
+        try:
+            with open(filepath, "rb") as f:
+                html = f.read()
+            panel_dict = editor.create_panel_dict(html)
+        except Exception as e:
+            LOGGER.warning(f"Could not read updated panel schedule: {e}")
+            return
+        self.panel_hash = panel_hash
+        self.panel_dict = panel_dict
+        LOGGER.info(f"Panel schedule updated with {len(panel_dict)} segments.")
+        self.panel_dictionary_updated.emit(dict(panel_dict))
+
+    def scan_pdf_index(self) -> float:
+        stage_start = time.perf_counter()
+        self.pdf_index.scan()
+        return time.perf_counter() - stage_start
+
     @Slot()
-    def run_checks(self):
-        if self.pdf_root_folder is not None:
+    def scan_folders(self):
+        """
+        Find the files changed since the save file was written, ahead of the initial checks.
+
+        The FS Manager PDF folder is indexed on a second thread while the website folder is hashed, and both
+        are usually done before the remote snapshot arrives.
+        """
+        stage_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            if self.pdf_index is not None:
+                pdf_scan = executor.submit(self.scan_pdf_index)
+            else:
+                pdf_scan = None
+            files_to_upload = editor.list_files_to_upload(
+                self.local_website_folder,
+                self.save_state,
+                self.normalisation_rules,
+                self.stat_cache,
+                self.save_algorithm,
+            )
+            self.stage_completed.emit("site scan", time.perf_counter() - stage_start)
+            if pdf_scan is not None:
+                self.stage_completed.emit("PDF scan", pdf_scan.result())
+        self.scanned_files = files_to_upload
+
+    @Slot(dict)
+    def run_checks(self, remote_snapshot: dict[str, ftp.RemoteFile]):
+        """
+        Queue the files changed since the save file was written, and the PDFs to copy.
+
+        The folders are scanned here unless `scan_folders` has already done so. When PDFs are uploaded
+        directly, the copies of target PDFs in the website folder are ignored and the indexed PDFs in the FS
+        Manager folder are checked against the save file instead.
+        """
+        stage_start = time.perf_counter()
+        if self.scanned_files is None:
+            self.scan_folders()
+        files_to_upload = self.scanned_files
+        self.scanned_files = None
+
+        self.send_pdfs_to_copy()
+        if self.uploads_pdfs_directly():
+            files_to_upload = self.drop_pdf_copies(files_to_upload)
+            files_to_upload += editor.list_changed_files(
+                self.hash_indexed_pdfs(), self.save_state
+            )
+        files_to_upload = self.drop_remote_matches(files_to_upload, remote_snapshot)
+        if len(files_to_upload) > 0:
+            time_now = QDateTime.currentMSecsSinceEpoch()
+            self.files_to_upload.emit(
+                [(file, time_now, "create") for file in files_to_upload]
+            )
+        self.stage_completed.emit("initial checks", time.perf_counter() - stage_start)
+
+    def send_pdfs_to_copy(self):
+        if self.pdf_index is not None and self.pdf_upload_mode != "direct":
             pdfs_to_copy = editor.list_pdfs_to_copy(
-                self.pdf_root_folder, self.local_website_folder, editor.TARGET_PDFS
+                self.pdf_index, self.local_website_folder
+            )
+            if len(pdfs_to_copy) > 0:
+                time_now = QDateTime.currentMSecsSinceEpoch()
+                self.pdfs_to_copy.emit(
+                    [(pdf, time_now, "create") for pdf in pdfs_to_copy]
+                )
+
+    def drop_pdf_copies(self, filepaths: list[str]) -> list[str]:
+        return [
+            filepath
+            for filepath in filepaths
+            if not editor.is_website_copy_of_pdf(
+                filepath, self.local_website_folder, self.pdf_index.target_pdfs
             )
-            for pdf in pdfs_to_copy:
-                self.pdf_to_copy.emit(pdf, QDateTime.currentDateTime(), "create")
+        ]
 
-        files_to_upload = editor.list_files_to_upload(
-            self.local_website_folder, self.save_state
+    @Slot()
+    def rescan_website(self):
+        """
+        Check the website folder once in place of the events of an event storm.
+
+        Files changed since they were last uploaded are sent on with the `rescan` operation, and uploaded files
+        since deleted as deletions, which `record_deletions` forgets and journals once they are dealt with. The
+        panel schedule is parsed again if it has changed.
+        """
+        current_state = editor.create_hash_dict(
+            self.local_website_folder,
+            self.normalisation_rules,
+            self.stat_cache,
+            self.save_algorithm,
+        )
+        changed_files = editor.list_changed_files(current_state, self.save_state)
+        if self.uploads_pdfs_directly():
+            changed_files = self.drop_pdf_copies(changed_files)
+        deleted_files = [
+            filepath
+            for filepath in self.save_state
+            if filepath.startswith(self.local_website_folder + os.sep)
+            and filepath not in current_state
+        ]
+        LOGGER.info(
+            f"Rescan found {len(changed_files)} changed and {len(deleted_files)} deleted files."
+        )
+
+        time_now = QDateTime.currentMSecsSinceEpoch()
+        events = [(filepath, time_now, "rescan") for filepath in changed_files]
+        events += [(filepath, time_now, "delete") for filepath in deleted_files]
+        if len(events) > 0:
+            self.files_to_upload.emit(events)
+        self.update_panel_dict(
+            [
+                (
+                    os.path.join(self.local_website_folder, "index.htm"),
+                    time_now,
+                    "modify",
+                )
+            ]
         )
+
+    @Slot()
+    def rescan_pdfs(self):
+        """
+        Index the FS Manager PDF folder again in place of the events of an event storm.
+        """
+        if self.pdf_index is None:
+            return
+        self.pdf_index.scan()
+        self.send_pdfs_to_copy()
+        if self.uploads_pdfs_directly():
+            changed_files = editor.list_changed_files(
+                self.hash_indexed_pdfs(), self.save_state
+            )
+            if len(changed_files) > 0:
+                time_now = QDateTime.currentMSecsSinceEpoch()
+                self.files_to_upload.emit(
+                    [(filepath, time_now, "rescan") for filepath in changed_files]
+                )
+
+    @Slot(list)
+    def update_pdf_index(self, events: list[tuple[str, int, str]]):
+        if self.pdf_index is not None:
+            for filepath, _, _ in events:
+                self.pdf_index.update(filepath)
+
+    def drop_remote_matches(
+        self, files_to_upload: list[str], remote_snapshot: dict[str, ftp.RemoteFile]
+    ) -> list[str]:
+        """
+        Remove files from the initial upload list whose remote copies already match.
+
+        The hashes of the matching files are sent on to the uploader so later events for them are deduplicated.
+        """
+        remaining_files = []
+        matched_hashes = dict()
         for file in files_to_upload:
-            self.file_to_upload.emit(file, QDateTime.currentDateTime(), "create")
+            remote_name = editor.get_remote_name(file, self.local_website_folder)
+            remote_file = remote_snapshot.get(remote_name)
+            if remote_file is not None:
+                try:
+                    sent_hash = remote_copy_matches(
+                        file,
+                        remote_file,
+                        self.edits_engine,
+                        self.normalisation_rules,
+                        self.edit_cache,
+                    )
+                except OSError as e:
+                    LOGGER.warning(f"Could not compare {file} with remote copy: {e}")
+                    sent_hash = None
+                if sent_hash is not None:
+                    matched_hashes[remote_name] = sent_hash
+                    self.record_upload(file, QDateTime.currentDateTime())
+                    continue
+            remaining_files.append(file)
+        if len(matched_hashes) > 0:
+            LOGGER.info(f"Skipping {len(matched_hashes)} files already on the remote.")
+            self.remote_matches.emit(matched_hashes)
+        return remaining_files
 
     @Slot(QDateTime)
     def create_save_file(self, check_time: QDateTime):
         if self.save_filepath is not None:
-            save_file = editor.create_hash_dict(self.local_website_folder)
-            save_file = editor.trim_hash_dict(save_file, self.panel_dict, check_time)
-            with open(self.save_filepath, "w") as f:
-                json.dump(save_file, f)
+            if self.save_algorithm != self.hash_algorithm:
+                self.stat_cache.clear()
+                self.save_algorithm = self.hash_algorithm
+            save_file = editor.create_hash_dict(
+                self.local_website_folder,
+                self.normalisation_rules,
+                self.stat_cache,
+                self.hash_algorithm,
+            )
+            save_file = editor.trim_hash_dict(
+                save_file, self.panel_dict, check_time, self.local_website_folder
+            )
+            if self.uploads_pdfs_directly():
+                save_file.update(self.hash_indexed_pdfs())
+            editor.write_json_atomically(
+                self.save_filepath,
+                editor.write_save_state(
+                    save_file,
+                    self.stat_cache,
+                    self.normalisation_rules,
+                    self.hash_algorithm,
+                ),
+            )
+            self.journal.clear()
             self.save_written.emit()
 
 
 class PdfCopier(QObject):
     copy_successful = Signal(str)
 
-    def __init__(self, destination: str):
+    def __init__(self, destination: str, link: bool = False):
         super().__init__()
         self.destination_filepath = destination
+        self.link = link
 
     @Slot(str, str)
     def copy_pdf(self, source_filepath: str):
+        """
+        Copy a PDF into the website folder, unless the copy there is already current.
+
+        If linking, the PDF is hard linked instead where the filesystem allows, and copied otherwise.
+        """
+        destination_filepath = os.path.join(
+            self.destination_filepath, os.path.basename(source_filepath)
+        )
         try:
-            shutil.copyfile(
-                source_filepath,
-                os.path.join(
-                    self.destination_filepath, os.path.basename(source_filepath)
-                ),
+            source_stat = os.stat(source_filepath)
+            source = editor.PdfEntry(
+                source_filepath, source_stat.st_size, source_stat.st_mtime_ns
             )
+            if editor.pdf_needs_copy(source, destination_filepath):
+                if self.link:
+                    self.link_pdf(source_filepath, destination_filepath)
+                else:
+                    shutil.copyfile(source_filepath, destination_filepath)
             self.copy_successful.emit(source_filepath)
-        except PermissionError as e:
+        except (PermissionError, FileNotFoundError) as e:
             LOGGER.error(f"Error copying file: {e}")
 
+    def link_pdf(self, source_filepath: str, destination_filepath: str):
+        # Links can't overwrite. The website folder copy is never uploaded in this mode, so it can be missing briefly.
+        try:
+            if os.path.lexists(destination_filepath):
+                os.remove(destination_filepath)
+            os.link(source_filepath, destination_filepath)
+        except FileNotFoundError:
+            raise
+        except OSError as e:
+            LOGGER.debug(f"Could not link {source_filepath}, copying instead: {e}")
+            shutil.copyfile(source_filepath, destination_filepath)
+
 
 class FtpUploader(QObject):
-    upload_successful = Signal(str)
+    """
+    A single session of the FTP upload pool.
+
+    Each uploader holds its own authenticated connection in the remote directory. Files in subfolders of the
+    website folder are uploaded under their path relative to it, without changing directory. Requests from the
+    main window are broadcast to every session in the pool, so each slot taking a session ID ignores requests
+    addressed to another session.
+    """
+
+    upload_successful = Signal(str, int)
+    upload_unchanged = Signal(str, int)
+    upload_failed = Signal(str, int)
+    deletion_successful = Signal(list, int)
     upload_retry_signal = Signal(str, int)
-    give_up_signal = Signal(str)
-    connection_successful_signal = Signal(str)
-    keepalive_successful = Signal()
+    give_up_signal = Signal(int, str)
+    connection_successful_signal = Signal(int, str)
+    keepalive_successful = Signal(int)
+    remote_snapshot_signal = Signal(dict)
 
     def __init__(
         self,
+        session_id: int,
         host: str,
         port: str,
         username: str,
         password: str,
         remote_directory: str,
-        replacement_dict: dict[str, str],
+        local_website_folder: str,
+        edits_engine: editor.ReplacementEngine,
         allow_insecure: bool,
+        sent_hashes: dict[str, str],
+        sent_stats: dict[str, tuple[tuple[int, int, int], str]],
+        remote_directories: set[str],
+        normalisation_rules: list[re.Pattern],
+        fetch_remote_hashes: bool = False,
+        edit_cache: editor.EditCache | None = None,
     ):
         super().__init__()
+        self.session_id = session_id
         self.host = host
         self.port = port
         self.username = username
         self.password = password
         self.remote_directory = remote_directory
-        self.replacement_dict = replacement_dict
+        self.local_website_folder = local_website_folder
+        self.edits_engine = edits_engine
+        self.edit_cache = edit_cache
         self.allow_insecure = allow_insecure
+        self.fetch_remote_hashes = fetch_remote_hashes
+        self.normalisation_rules = normalisation_rules
+        # Remote filename -> SHA-256 of the bytes last sent, shared by every session in the pool. A file is only
+        # ever in progress on one session at a time, so sessions never write the same key concurrently.
+        self.sent_hashes = sent_hashes
+        # Filepath -> (size, modification time, inode) and the digest of the bytes an upload sends for them, shared
+        # by every session in the pool, so a file queued again without changing is skipped without being read.
+        self.sent_stats = sent_stats
+        # Remote subdirectories known to exist, shared by every session in the pool so each is only made once.
+        self.remote_directories = remote_directories
+        self.ftp_connection = None
         self.upload_retry_signal.connect(self.upload_file)
 
     @Slot()
@@ -154,49 +756,194 @@ class FtpUploader(QObject):
                 self.host, self.port, self.username, self.password, self.allow_insecure
             )
             self.ftp_connection.set_working_directory(self.remote_directory)
-            self.connection_successful_signal.emit(self.ftp_connection.get_welcome())
+            self.connection_successful_signal.emit(
+                self.session_id, self.ftp_connection.get_welcome()
+            )
         except Exception as e:
             self.error_stop(e)
 
-    @Slot()
-    def send_keepalive_signal(self):
+    @Slot(int)
+    def reconnect(self, session_id: int):
+        if session_id != self.session_id:
+            return
+        self.stop()
+        self.initiate_ftp_connection()
+
+    @Slot(int)
+    def send_keepalive_signal(self, session_id: int):
+        if session_id != self.session_id:
+            return
         try:
             self.ftp_connection.keepalive()
-            self.keepalive_successful.emit()
+            self.keepalive_successful.emit(self.session_id)
         except Exception as e:
             self.error_stop(e)
 
+    @Slot(int)
+    def take_remote_snapshot(self, session_id: int):
+        """
+        Send a snapshot of the remote directory, or an empty one if the listing fails.
+        """
+        if session_id != self.session_id:
+            return
+        try:
+            remote_snapshot = self.ftp_connection.get_remote_snapshot(
+                self.fetch_remote_hashes, self.remote_directories
+            )
+        except Exception as e:
+            LOGGER.warning(f"Could not take snapshot of remote directory: {e}")
+            remote_snapshot = dict()
+        # The server hashes raw bytes, so its checksums only stand in for the digests of files never normalised.
+        for remote_name, remote_file in remote_snapshot.items():
+            if remote_file.sha256 is not None and not editor.get_normalisation_rules(
+                remote_name, self.normalisation_rules
+            ):
+                self.sent_hashes.setdefault(remote_name, remote_file.sha256)
+        self.remote_snapshot_signal.emit(remote_snapshot)
+
+    @Slot(str, int)
+    def receive_upload_signal(self, source_filepath: str, session_id: int):
+        if session_id == self.session_id:
+            self.upload_file(source_filepath, 0)
+
     @Slot(str, int)
     def upload_file(self, source_filepath: str, retry_count: int):
+        """
+        Upload a file, skipping it if the bytes to send match those last sent under the same remote name.
+
+        Text files are compared after normalisation, so changes confined to volatile content are not sent. Only
+        failures of the connection are retried, and give up the session once out of retries. A file that cannot be
+        read or edited is reported as failed, for the main window to try again later.
+        """
         if retry_count < RETRIES:
+            remote_name = editor.get_remote_name(
+                source_filepath, self.local_website_folder
+            )
+            normalisation_rules = editor.get_normalisation_rules(
+                source_filepath, self.normalisation_rules
+            )
             try:
-                file_object = io.BytesIO()
-                if source_filepath.endswith(EDITABLE_TEXT_EXTENSIONS):
-                    with open(source_filepath, "r") as f:
-                        html_string = f.read()
-
-                    html_string = replace_strings(html_string, self.replacement_dict)
-
-                    n_bytes = file_object.write(html_string.encode("utf-8"))
-                else:
-                    with open(source_filepath, "rb") as f:
-                        n_bytes = file_object.write(f.read())
-                LOGGER.info(
-                    f"Read {os.path.basename(source_filepath)}, size {n_bytes / 1000:.1f} kb"
+                new_digest, content = self.get_upload_digest(
+                    source_filepath, normalisation_rules
                 )
-                file_object.seek(0)
-                self.ftp_connection.upload(
-                    os.path.basename(source_filepath), file_object
+                if self.sent_hashes.get(remote_name) == new_digest:
+                    LOGGER.info(
+                        f"Session {self.session_id + 1} skipped {remote_name}, unchanged since last upload"
+                    )
+                    self.upload_unchanged.emit(source_filepath, self.session_id)
+                    return
+            except Exception as e:
+                self.fail_upload(source_filepath, e)
+                return
+
+            try:
+                self.ftp_connection.make_directories(
+                    remote_name, self.remote_directories
                 )
-                file_object.close()
-                self.upload_successful.emit(source_filepath)
-            except Exception:
+                if content is None:
+                    content = read_edited_chunks(
+                        source_filepath, self.edits_engine, self.edit_cache
+                    )
+                sent_hash = editor.ContentDigest(normalisation_rules)
+                with ftp.ChunkReader(hash_chunks(content, sent_hash)) as file_object:
+                    self.ftp_connection.upload(
+                        remote_name, file_object, UPLOAD_BLOCK_SIZE
+                    )
+                    n_bytes = file_object.tell()
+                    read_error = file_object.read_error
+            except ftplib.all_errors:
+                # The directories may have been refused for another reason than existing, so are made again.
+                for directory in ftp.get_parent_directories(remote_name):
+                    self.remote_directories.discard(directory)
                 self.upload_retry_signal.emit(source_filepath, retry_count + 1)
+                return
+            except Exception as e:
+                self.fail_upload(source_filepath, e)
+                return
+            if read_error is not None:
+                # The remote copy is cut short, so nothing is recorded as sent and the file goes again.
+                self.fail_upload(source_filepath, read_error)
+                return
+            self.sent_hashes[remote_name] = sent_hash.hexdigest()
+            if self.sent_hashes[remote_name] != new_digest:
+                # The file changed after it was hashed, so its stat may not match what was sent.
+                self.sent_stats.pop(source_filepath, None)
+            LOGGER.info(
+                f"Session {self.session_id + 1} sent {remote_name}, size {n_bytes / 1000:.1f} kb"
+            )
+            self.upload_successful.emit(source_filepath, self.session_id)
         else:
             self.error_stop(ConnectionError("Upload retry limit exceeded."))
 
+    def get_upload_digest(
+        self, source_filepath: str, normalisation_rules: list[re.Pattern] | None
+    ) -> tuple[str, list[bytes] | None]:
+        """
+        Return the digest of the bytes an upload of the file sends, with the edited bytes if they had to be read.
+
+        Files unchanged since last hashed by the pool are not read. Otherwise text files are edited once, from the
+        edit cache where possible, and the edited bytes are returned to be sent from memory, as edited text is
+        small. Other files are hashed and read again if they are sent, so large files are never held in memory.
+        """
+        stat_key = editor.get_stat_key(os.stat(source_filepath))
+        cached_entry = self.sent_stats.get(source_filepath)
+        if cached_entry is not None and cached_entry[0] == stat_key:
+            return cached_entry[1], None
+
+        new_hash = editor.ContentDigest(normalisation_rules)
+        chunks = hash_chunks(
+            read_edited_chunks(source_filepath, self.edits_engine, self.edit_cache),
+            new_hash,
+        )
+        content = None
+        if source_filepath.endswith(EDITABLE_TEXT_EXTENSIONS):
+            content = list(chunks)
+        else:
+            for _ in chunks:
+                pass
+        new_digest = new_hash.hexdigest()
+        if time.time_ns() - stat_key[1] > editor.STAT_RACE_MARGIN_NS:
+            self.sent_stats[source_filepath] = (stat_key, new_digest)
+        else:
+            self.sent_stats.pop(source_filepath, None)
+        return new_digest, content
+
+    def fail_upload(self, source_filepath: str, error: Exception):
+        LOGGER.warning(
+            f"Session {self.session_id + 1} could not upload {source_filepath}: {error}"
+        )
+        self.upload_failed.emit(source_filepath, self.session_id)
+
+    @Slot(list, int)
+    def delete_files(self, source_filepaths: list[str], session_id: int):
+        """
+        Delete the remote copies of a batch of deleted files, with one DELE each.
+
+        Files the server refuses to delete, usually because they were never uploaded, count as deleted. Their
+        remote names are forgotten, so a file created again with the same content is uploaded again.
+        """
+        if session_id != self.session_id:
+            return
+        try:
+            deleted = 0
+            for source_filepath in source_filepaths:
+                remote_name = editor.get_remote_name(
+                    source_filepath, self.local_website_folder
+                )
+                if self.ftp_connection.delete(remote_name) is True:
+                    deleted += 1
+                self.sent_hashes.pop(remote_name, None)
+                self.sent_stats.pop(source_filepath, None)
+        except Exception as e:
+            self.error_stop(e)
+            return
+        LOGGER.info(
+            f"Session {self.session_id + 1} deleted {deleted} of {len(source_filepaths)} files from remote"
+        )
+        self.deletion_successful.emit(source_filepaths, self.session_id)
+
     def error_stop(self, error_message: Exception):
-        self.give_up_signal.emit(f"{error_message}")
+        self.give_up_signal.emit(self.session_id, f"{error_message}")
 
     @Slot()
     def stop(self):
@@ -206,70 +953,363 @@ class FtpUploader(QObject):
             pass
 
 
+class ScandirObserver(threading.Thread):
+    """
+    Watches a folder by listing it with `os.scandir` and comparing listings, for folders on network shares where
+    the operating system sends no change notifications. Has the parts of the watchdog observer interface used by
+    `WatcherObject`.
+
+    The folder is listed every `min_interval` seconds while files are changing, backing off to `max_interval`
+    while nothing changes. On Windows listings include the size and modification time of each file. Elsewhere new
+    files are stat'ed straight away and at most `stat_budget` others in each cycle, in turn, so a large folder
+    costs the same each cycle. A listing that fails, such as while the share is unavailable, is skipped rather
+    than reported as files being deleted.
+    """
+
+    min_interval = 0.25
+    max_interval = 4.0
+    backoff = 1.5
+    stat_budget = 500
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.event_handler: FileSystemEventHandler | None = None
+        self.path: str | None = None
+        self.recursive = False
+        self.event_filter: tuple[type[FileSystemEvent], ...] | None = None
+        self.stopped = threading.Event()
+        self.interval = self.min_interval
+        # Filepath -> (size, modification time) when last stat'ed.
+        self.files: dict[str, tuple[int, int]] = dict()
+        self.stat_order: list[str] = []
+        self.stat_position = 0
+        self.listing_failed = False
+
+    def schedule(
+        self,
+        event_handler: FileSystemEventHandler,
+        path: str,
+        recursive: bool = False,
+        event_filter: list[type[FileSystemEvent]] | None = None,
+    ):
+        self.event_handler = event_handler
+        self.path = path
+        self.recursive = recursive
+        if event_filter is not None:
+            self.event_filter = tuple(event_filter)
+
+    def run(self):
+        # The first listing only records the files already there.
+        self.poll()
+        while not self.stopped.wait(self.interval):
+            events = self.poll()
+            for event in events:
+                if self.event_filter is None or isinstance(event, self.event_filter):
+                    self.event_handler.dispatch(event)
+            if len(events) > 0:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+
+    def stop(self):
+        self.stopped.set()
+
+    def list_folder(self) -> dict[str, os.DirEntry] | None:
+        listing = dict()
+        folders = [self.path]
+        try:
+            while len(folders) > 0:
+                with os.scandir(folders.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive is True:
+                                folders.append(entry.path)
+                        else:
+                            listing[entry.path] = entry
+        except OSError as e:
+            if self.listing_failed is False:
+                LOGGER.warning(f"Could not list {self.path}: {e}")
+            self.listing_failed = True
+            return None
+        self.listing_failed = False
+        return listing
+
+    def poll(self) -> list[FileSystemEvent]:
+        """
+        List the folder, returning events for the files created, deleted and modified since the last listing.
+        """
+        listing = self.list_folder()
+        if listing is None:
+            return []
+        events = []
+        for filepath in self.files.keys() - listing.keys():
+            del self.files[filepath]
+            events.append(FileDeletedEvent(filepath))
+
+        if os.name == "nt":
+            filepaths_to_stat = list(listing)
+        else:
+            filepaths_to_stat = [
+                filepath for filepath in listing if filepath not in self.files
+            ]
+            if self.stat_position >= len(self.stat_order):
+                self.stat_order = list(self.files)
+                self.stat_position = 0
+            next_position = self.stat_position + self.stat_budget
+            filepaths_to_stat += [
+                filepath
+                for filepath in self.stat_order[self.stat_position : next_position]
+                if filepath in listing
+            ]
+            self.stat_position = next_position
+
+        for filepath in filepaths_to_stat:
+            try:
+                stat_result = listing[filepath].stat()
+            except OSError:
+                continue
+            stat_key = (stat_result.st_size, stat_result.st_mtime_ns)
+            last_stat_key = self.files.get(filepath)
+            if last_stat_key == stat_key:
+                continue
+            self.files[filepath] = stat_key
+            if last_stat_key is None:
+                events.append(FileCreatedEvent(filepath))
+            else:
+                events.append(FileModifiedEvent(filepath))
+        return events
+
+
 class WatcherObject(QObject):
-    file_created = Signal(str, QDateTime, str)
-    file_deleted = Signal(str, QDateTime, str)
-    file_modified = Signal(str, QDateTime, str)
-    file_moved = Signal(str, QDateTime, str)
+    """
+    Watches a folder, sending its events in batches as lists of (path, time in ms since epoch, operation).
+
+    Events are collected for `batch_interval` seconds after the first event of a batch, so a burst of events is
+    sent to the main window as one queued signal rather than one for each event. Events for the same path within
+    a batch are coalesced into one, timed at the last of them.
+
+    More than `storm_events` events within `storm_window` seconds start an event storm, such as when FS Manager
+    regenerates the whole site. Events are then only counted until none have arrived for `quiet_interval`
+    seconds, when `rescan_requested` is sent so the folder is checked once in their place. This also recovers
+    events the operating system dropped when its event queue overflowed.
+
+    With `polling`, the folder is listed periodically by a `ScandirObserver` instead of watched through the
+    operating system, for network shares that send no notifications.
+    """
+
+    file_events = Signal(list)
+    rescan_requested = Signal()
+    batch_interval = 0.1
+    storm_events = 1000
+    storm_window = 1.0
+    quiet_interval = 1.0
 
     def __init__(
         self,
         path: str,
         recursive: bool = False,
         signal_mask: tuple = tuple(),
+        polling: bool = False,
         parent=None,
     ):
         super().__init__(parent)
+        self.path = path
         self.target_pdfs = editor.TARGET_PDFS
-        self._observer = Observer()
+        self.pending_events: dict[str, tuple[int, str]] = dict()
+        self.pending_lock = threading.Lock()
+        self.batch_timer: threading.Timer | None = None
+        # Events received from watchdog, and events sent on after filtering and coalescing.
+        self.raw_events = 0
+        self.forwarded_events = 0
+        self.storms = 0
+        self.in_storm = False
+        self.window_start = time.monotonic()
+        self.window_events = 0
+        self.last_event = self.window_start
+        self.quiet_timer: threading.Timer | None = None
+        if polling is True:
+            self._observer = ScandirObserver()
+        else:
+            self._observer = Observer()
         self._event_handler = QWatchdog(self, signal_mask=signal_mask)
-        self._observer.schedule(self._event_handler, path, recursive=recursive)
+        # Opening and reading files, as when they are hashed or uploaded, would otherwise count towards storms.
+        self._observer.schedule(
+            self._event_handler,
+            path,
+            recursive=recursive,
+            event_filter=[
+                FileCreatedEvent,
+                FileDeletedEvent,
+                FileModifiedEvent,
+                FileMovedEvent,
+                FileClosedEvent,
+            ],
+        )
         self._observer.start()
-        LOGGER.info(f"Started filesystem watcher observing {path}")
+        if polling is True:
+            LOGGER.info(f"Started filesystem watcher polling {path}")
+        else:
+            LOGGER.info(f"Started filesystem watcher observing {path}")
+
+    def __str__(self):
+        return (
+            f"Watcher of {self.path}: {self.raw_events} events, {self.forwarded_events} forwarded, "
+            f"{self.storms} storms"
+        )
+
+    def count_event(self) -> bool:
+        """
+        Count an event from watchdog, returning False if it is part of an event storm and should be dropped.
+        """
+        time_now = time.monotonic()
+        with self.pending_lock:
+            self.raw_events += 1
+            self.last_event = time_now
+            if self.in_storm is True:
+                return False
+            if time_now - self.window_start > self.storm_window:
+                self.window_start = time_now
+                self.window_events = 0
+            self.window_events += 1
+            if self.window_events <= self.storm_events:
+                return True
+            self.in_storm = True
+            self.storms += 1
+            self.pending_events = dict()
+            if self.batch_timer is not None:
+                self.batch_timer.cancel()
+                self.batch_timer = None
+            self.start_quiet_timer(self.quiet_interval)
+        LOGGER.info(f"Event storm in {self.path}, waiting for it to pass to rescan.")
+        return False
+
+    def start_quiet_timer(self, interval: float):
+        self.quiet_timer = threading.Timer(interval, self.check_storm)
+        self.quiet_timer.daemon = True
+        self.quiet_timer.start()
+
+    def check_storm(self):
+        with self.pending_lock:
+            if self.quiet_timer is None:
+                return
+            quiet_time = time.monotonic() - self.last_event
+            if quiet_time < self.quiet_interval:
+                self.start_quiet_timer(self.quiet_interval - quiet_time)
+                return
+            self.quiet_timer = None
+            self.in_storm = False
+            self.window_start = time.monotonic()
+            self.window_events = 0
+        LOGGER.info(f"Event storm in {self.path} over, rescanning.")
+        self.rescan_requested.emit()
+
+    def add_event(self, filepath: str, operation: str):
+        with self.pending_lock:
+            pending_event = self.pending_events.pop(filepath, None)
+            if pending_event is not None:
+                operation = coalesce_operations(pending_event[1], operation)
+            self.pending_events[filepath] = (
+                QDateTime.currentMSecsSinceEpoch(),
+                operation,
+            )
+            if self.batch_timer is None:
+                self.batch_timer = threading.Timer(
+                    self.batch_interval, self.send_events
+                )
+                self.batch_timer.daemon = True
+                self.batch_timer.start()
+
+    def send_events(self):
+        with self.pending_lock:
+            events = [
+                (filepath, event_time, operation)
+                for filepath, (event_time, operation) in self.pending_events.items()
+            ]
+            self.pending_events = dict()
+            self.batch_timer = None
+            self.forwarded_events += len(events)
+        if len(events) > 0:
+            self.file_events.emit(events)
 
     def stop(self):
         self._observer.stop()
         self._observer.join()
+        with self.pending_lock:
+            if self.batch_timer is not None:
+                self.batch_timer.cancel()
+                self.batch_timer = None
+            if self.quiet_timer is not None:
+                self.quiet_timer.cancel()
+                self.quiet_timer = None
+            self.pending_events = dict()
+        LOGGER.info(f"{self}")
+
+
+def coalesce_operations(earlier: str, later: str) -> str:
+    """
+    Combine two operations on the same path into the one to send on.
+
+    Creations are kept over later modifications, and a modification after a deletion means the file was
+    created again. Otherwise the later operation wins.
+    """
+    if later == "modify":
+        if earlier in ("create", "move"):
+            return earlier
+        if earlier == "delete":
+            return "create"
+    return later
 
 
 class QWatchdog(FileSystemEventHandler):
+    """
+    Passes the file events matching the signal mask on to a `WatcherObject`.
+
+    Checks are made on the path alone, without touching the disk: directories and the temporary files written by
+    editors and copy tools are dropped.
+    """
+
+    temp_prefixes = ("~$", ".~")
+    temp_suffixes = ("~", ".tmp", ".temp", ".part", ".partial", ".crdownload", ".swp")
+
     def __init__(self, watcher_object: WatcherObject, signal_mask: tuple):
         super().__init__()
         self.watcher_object = watcher_object
-        self.signal_mask = signal_mask
+        self.signal_mask = tuple(signal_mask)
 
-    def test_filepath(self, filepath: str):
-        is_file = os.path.isfile(filepath)
-        if len(self.signal_mask) > 0:
-            has_ending = filepath.endswith(self.signal_mask)
-        else:
-            has_ending = True
-
-        if all([is_file, has_ending]):
-            return filepath
-        else:
+    def test_filepath(self, filepath: str) -> str | None:
+        if len(self.signal_mask) > 0 and not filepath.endswith(self.signal_mask):
+            return None
+        filename = os.path.basename(filepath)
+        if filename.startswith(self.temp_prefixes) or filename.lower().endswith(
+            self.temp_suffixes
+        ):
             return None
+        return filepath
+
+    def dispatch(self, event: FileSystemEvent):
+        if self.watcher_object.count_event() is False or event.is_directory:
+            return
+        super().dispatch(event)
 
     def on_created(self, event: FileSystemEvent):
         if self.test_filepath(event.src_path) is not None:
-            self.watcher_object.file_created.emit(
-                event.src_path, QDateTime.currentDateTime(), "create"
-            )
+            self.watcher_object.add_event(event.src_path, "create")
 
     def on_deleted(self, event: FileSystemEvent):
         if self.test_filepath(event.src_path) is not None:
-            self.watcher_object.file_deleted.emit(
-                event.src_path, QDateTime.currentDateTime(), "delete"
-            )
+            self.watcher_object.add_event(event.src_path, "delete")
 
     def on_modified(self, event: FileSystemEvent):
         if self.test_filepath(event.src_path) is not None:
-            self.watcher_object.file_modified.emit(
-                event.src_path, QDateTime.currentDateTime(), "modify"
-            )
+            self.watcher_object.add_event(event.src_path, "modify")
+
+    def on_closed(self, event: FileSystemEvent):
+        if self.test_filepath(event.src_path) is not None:
+            self.watcher_object.add_event(event.src_path, "close")
 
     def on_moved(self, event: FileSystemEvent):
+        # A file renamed away is gone under its old name, unless the old name was a temporary file.
+        if self.test_filepath(event.src_path) is not None:
+            self.watcher_object.add_event(event.src_path, "delete")
         if self.test_filepath(event.dest_path) is not None:
-            self.watcher_object.file_moved.emit(
-                event.dest_path, QDateTime.currentDateTime(), "move"
-            )
+            self.watcher_object.add_event(event.dest_path, "move")